@@ -0,0 +1,431 @@
+import re
+import json
+import time
+import random
+import asyncio
+import base64
+import threading
+import itertools
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+################################
+# Fake LLM & TTS Backends      #
+################################
+
+# Stand-ins for the OpenAI, Anthropic and edge-tts endpoints the pipeline
+# talks to. They answer with well-formed, deterministic content after a
+# configurable latency (+ jitter) and fail a configurable share of requests,
+# so run_pipeline can be measured without network access or API costs.
+
+# A few hundred bytes that look like an MP3 frame header; the pipeline never decodes them.
+FAKE_MP3 = b"\xff\xfb\x90\x64" + bytes(412)
+# Half a second of 24 kHz 16-bit silence for streamed (pcm16) audio.
+FAKE_PCM16 = bytes(24000)
+RATE_LIMIT = 10000
+
+_COUNT_RE = re.compile(r"Task:\s*(\d+)")
+_PACKED_ENTRY_RE = re.compile(r"^(w\d+) \| \"(.*?)\" \| (\d+) \|", re.MULTILINE)
+_WORD_RE = re.compile(r'Main word:\s*"(.*?)"')
+
+
+class BackendProfile:
+    """Latency / jitter / error-rate settings shared by all fakes."""
+
+    def __init__(self, latency=0.2, jitter=0.05, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            offset = self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency + offset)
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+def fake_sentences(prompt):
+    """Answers a single-word or packed generation prompt with valid pairs."""
+    entries = _PACKED_ENTRY_RE.findall(prompt)
+    if entries:
+        return json.dumps(
+            {
+                task_id: [
+                    f"Frase {i + 1} con {word}. | Satz {i + 1} mit {word}."
+                    for i in range(int(count))
+                ]
+                for task_id, word, count in entries
+            },
+            ensure_ascii=False,
+        )
+
+    count_match = _COUNT_RE.search(prompt)
+    word_match = _WORD_RE.search(prompt)
+    count = int(count_match.group(1)) if count_match else 5
+    word = word_match.group(1) if word_match else "parola"
+    return "\n".join(
+        f"Frase {i + 1} con {word}. | Satz {i + 1} mit {word}." for i in range(count)
+    )
+
+
+class FakeBackendServer:
+    """One local HTTP server speaking just enough of both provider APIs.
+
+    OpenAI clients use base_url http://host:port/v1, Anthropic clients use
+    http://host:port. Served endpoints:
+
+    - POST /v1/chat/completions (text, and audio when "audio" is requested)
+    - POST /v1/files, GET /v1/files/{id}/content, POST /v1/batches, GET /v1/batches/{id}
+    - POST /v1/messages, POST /v1/messages/batches,
+      GET /v1/messages/batches/{id}, GET /v1/messages/batches/{id}/results
+    """
+
+    def __init__(self, profile, host="127.0.0.1", port=0):
+        self.profile = profile
+        self.requests = 0
+        self.errors = 0
+        self._ids = itertools.count(1)
+        self._files = {}
+        self._batches = {}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+
+    @property
+    def openai_base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def anthropic_base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _next_id(self, prefix):
+        with self._lock:
+            return f"{prefix}_{next(self._ids)}"
+
+    # --- OpenAI ---
+
+    def openai_chat(self, body):
+        prompt = body["messages"][-1]["content"]
+        message = {"role": "assistant", "content": None}
+        if body.get("audio"):
+            message["audio"] = {
+                "id": self._next_id("audio"),
+                "data": base64.b64encode(FAKE_MP3).decode("ascii"),
+                "expires_at": 0,
+                "transcript": prompt,
+            }
+        else:
+            message["content"] = fake_sentences(prompt)
+        return {
+            "id": self._next_id("chatcmpl"),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(message["content"] or "") // 4,
+                "total_tokens": (len(prompt) + len(message["content"] or "")) // 4,
+            },
+        }
+
+    def openai_audio_stream(self, body):
+        """Server-sent events carrying base64 pcm16 chunks, like the streaming API."""
+        created = int(time.time())
+        chunk_id = self._next_id("chatcmpl")
+        events = []
+        for offset in range(0, len(FAKE_PCM16), 4800):
+            data = base64.b64encode(FAKE_PCM16[offset : offset + 4800]).decode()
+            events.append(
+                {
+                    "id": chunk_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": {"audio": {"data": data}}}],
+                }
+            )
+        lines = [f"data: {json.dumps(event)}\n\n" for event in events]
+        lines.append("data: [DONE]\n\n")
+        return "".join(lines).encode("utf-8")
+
+    def openai_upload(self, raw_body, content_type):
+        # multipart/form-data; the JSONL payload sits between the part headers and the boundary.
+        boundary = content_type.split("boundary=")[-1].encode()
+        file_id = self._next_id("file")
+        for part in raw_body.split(b"--" + boundary):
+            if b'name="file"' in part:
+                payload = part.split(b"\r\n\r\n", 1)[1]
+                self._files[file_id] = payload.rsplit(b"\r\n", 1)[0]
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(self._files.get(file_id, b"")),
+            "created_at": int(time.time()),
+            "filename": "batch_input.jsonl",
+            "purpose": "batch",
+            "status": "processed",
+        }
+
+    def openai_create_batch(self, body):
+        batch_id = self._next_id("batch")
+        lines = []
+        for line in self._files[body["input_file_id"]].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            lines.append(
+                json.dumps(
+                    {
+                        "id": self._next_id("req"),
+                        "custom_id": item["custom_id"],
+                        "response": {
+                            "status_code": 200,
+                            "body": self.openai_chat(item["body"]),
+                        },
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        output_file_id = self._next_id("file")
+        self._files[output_file_id] = "\n".join(lines).encode("utf-8")
+        self._batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "output_file_id": output_file_id,
+            "completion_window": body["completion_window"],
+            "status": "completed",
+            "created_at": int(time.time()),
+            "request_counts": {
+                "total": len(lines),
+                "completed": len(lines),
+                "failed": 0,
+            },
+        }
+        return self._batches[batch_id]
+
+    def ratelimit_headers(self, provider):
+        """Rate-limit headers shaped like the real APIs' (RATE_LIMIT requests per window)."""
+        with self._lock:
+            remaining = str(max(0, RATE_LIMIT - self.requests % RATE_LIMIT))
+        if provider == "openai":
+            return {
+                "x-ratelimit-limit-requests": str(RATE_LIMIT),
+                "x-ratelimit-remaining-requests": remaining,
+                "x-ratelimit-reset-requests": "6ms",
+            }
+        reset = datetime.now(timezone.utc) + timedelta(seconds=1)
+        return {
+            "anthropic-ratelimit-requests-limit": str(RATE_LIMIT),
+            "anthropic-ratelimit-requests-remaining": remaining,
+            "anthropic-ratelimit-requests-reset": reset.isoformat(timespec="seconds"),
+        }
+
+    # --- Anthropic ---
+
+    def anthropic_message(self, body):
+        prompt = body["messages"][-1]["content"]
+        text = fake_sentences(prompt)
+        return {
+            "id": self._next_id("msg"),
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": len(prompt) // 4,
+                "output_tokens": len(text) // 4,
+            },
+        }
+
+    def anthropic_create_batch(self, body):
+        batch_id = self._next_id("msgbatch")
+        results = [
+            {
+                "custom_id": request["custom_id"],
+                "result": {
+                    "type": "succeeded",
+                    "message": self.anthropic_message(request["params"]),
+                },
+            }
+            for request in body["requests"]
+        ]
+        self._batches[batch_id] = {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended",
+            "request_counts": {
+                "processing": 0,
+                "succeeded": len(results),
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": "2024-01-01T00:00:00Z",
+            "expires_at": "2024-01-02T00:00:00Z",
+            "ended_at": "2024-01-01T00:00:00Z",
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.anthropic_base_url}/v1/messages/batches/{batch_id}/results",
+            "_results": results,
+        }
+        return self._public(self._batches[batch_id])
+
+    @staticmethod
+    def _public(batch):
+        return {k: v for k, v in batch.items() if not k.startswith("_")}
+
+    # --- HTTP plumbing ---
+
+    def _make_handler(self):
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(
+                self, status, payload, content_type="application/json", headers=None
+            ):
+                body = (
+                    payload
+                    if isinstance(payload, bytes)
+                    else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                )
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _simulate(self):
+                with server._lock:
+                    server.requests += 1
+                time.sleep(server.profile.delay())
+                if server.profile.should_fail():
+                    with server._lock:
+                        server.errors += 1
+                    # Alternate between throttling and server errors like real outages do.
+                    throttled = server.requests % 2
+                    self._send(
+                        429 if throttled else 503,
+                        {"error": {"type": "fake_error", "message": "injected"}},
+                        headers=(
+                            {"retry-after-ms": str(int(server.profile.latency * 1000))}
+                            if throttled
+                            else None
+                        ),
+                    )
+                    return False
+                return True
+
+            def do_POST(self):
+                raw_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self._simulate():
+                    return
+                path = self.path.split("?")[0]
+                if path == "/v1/files":
+                    self._send(
+                        200,
+                        server.openai_upload(raw_body, self.headers["Content-Type"]),
+                    )
+                    return
+
+                body = json.loads(raw_body or b"{}")
+                if path == "/v1/chat/completions" and body.get("stream"):
+                    self._send(
+                        200, server.openai_audio_stream(body), "text/event-stream"
+                    )
+                elif path == "/v1/chat/completions":
+                    self._send(
+                        200,
+                        server.openai_chat(body),
+                        headers=server.ratelimit_headers("openai"),
+                    )
+                elif path == "/v1/batches":
+                    self._send(200, server.openai_create_batch(body))
+                elif path == "/v1/messages":
+                    self._send(
+                        200,
+                        server.anthropic_message(body),
+                        headers=server.ratelimit_headers("claude"),
+                    )
+                elif path == "/v1/messages/batches":
+                    self._send(200, server.anthropic_create_batch(body))
+                else:
+                    self._send(404, {"error": {"message": f"unknown path {path}"}})
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                parts = path.strip("/").split("/")
+                if path.startswith("/v1/files/") and path.endswith("/content"):
+                    self._send(200, server._files[parts[2]], "application/jsonl")
+                elif path.startswith("/v1/batches/"):
+                    self._send(200, server._batches[parts[2]])
+                elif path.startswith("/v1/messages/batches/") and path.endswith(
+                    "/results"
+                ):
+                    lines = [
+                        json.dumps(result, ensure_ascii=False)
+                        for result in server._batches[parts[3]]["_results"]
+                    ]
+                    self._send(
+                        200, "\n".join(lines).encode("utf-8"), "application/x-jsonl"
+                    )
+                elif path.startswith("/v1/messages/batches/"):
+                    self._send(200, server._public(server._batches[parts[3]]))
+                else:
+                    self._send(404, {"error": {"message": f"unknown path {path}"}})
+
+        return _Handler
+
+
+class FakeCommunicate:
+    """Drop-in for edge_tts.Communicate; install with install_fake_edge_tts()."""
+
+    profile = BackendProfile()
+    calls = 0
+    failures = 0
+
+    def __init__(self, text, voice, **kwargs):
+        self.text = text
+        self.voice = voice
+
+    async def save(self, audio_fname, metadata_fname=None):
+        FakeCommunicate.calls += 1
+        await asyncio.sleep(self.profile.delay())
+        if self.profile.should_fail():
+            FakeCommunicate.failures += 1
+            raise ConnectionError("injected edge-tts failure")
+        with open(audio_fname, "wb") as f:
+            f.write(FAKE_MP3)
+
+
+def install_fake_edge_tts(profile):
+    import edge_tts
+
+    FakeCommunicate.profile = profile
+    edge_tts.Communicate = FakeCommunicate
@@ -0,0 +1,302 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_backends import (
+    BackendProfile,
+    FakeBackendServer,
+    install_fake_edge_tts,
+)
+
+################################
+# Offline Pipeline Benchmarks  #
+################################
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def write_vocab_csv(path, rows, sentences):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["word", "count", "bonus_words", "bonus_mode", "setting"])
+        for i in range(rows):
+            writer.writerow([f"parola{i}", sentences, "", "", ""])
+
+
+def prepare_workdir(workdir, rows, args, server):
+    """Writes config.yaml, .env and the vocabulary CSV for one benchmark case."""
+    with open(REPO_ROOT / "config.yaml", "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    config["model"]["sentence_generation"] = args.provider
+    config["model"]["audio"] = args.audio
+    config["openai"]["audio"]["stream"] = args.stream_audio
+    config.setdefault("openai", {})["base_url"] = server.openai_base_url
+    config.setdefault("claude", {})["base_url"] = server.anthropic_base_url
+    config.setdefault("generation", {}).update(
+        {
+            "concurrency": args.llm_concurrency,
+            "requests_per_minute": None,
+            "tokens_per_minute": None,
+            "pack_size": args.pack,
+        }
+    )
+    config.setdefault("tts", {}).update(
+        {"concurrency": args.tts_concurrency, "backoff_seconds": 0.1}
+    )
+    config.setdefault("batch", {})["poll_interval_seconds"] = 0
+    config.setdefault("cache", {})["dir"] = os.path.join(workdir, ".cache")
+
+    with open(os.path.join(workdir, "config.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+    with open(os.path.join(workdir, ".env"), "w", encoding="utf-8") as f:
+        f.write("OPENAI_API_KEY=sk-fake\nANTHROPIC_API_KEY=sk-ant-fake\n")
+
+    csv_path = os.path.join(workdir, "vocab.csv")
+    write_vocab_csv(csv_path, rows, args.sentences)
+    return csv_path
+
+
+def run_case(workdir, csv_path, use_batch, profile_settings, results):
+    """Runs one pipeline in a fresh process, so peak RSS belongs to this case only."""
+    os.chdir(workdir)
+    install_fake_edge_tts(BackendProfile(**profile_settings))
+
+    from vocab_audio_automator.core import run_pipeline
+    from vocab_audio_automator.metrics import Metrics
+
+    messages = []
+    metrics = Metrics()
+    started = time.perf_counter()
+    ok = run_pipeline(
+        csv_path,
+        output_dir=os.path.join(workdir, "outputs"),
+        output_name="benchmark",
+        status_callback=messages.append,
+        use_cache=False,
+        use_batch=use_batch,
+        metrics=metrics,
+    )
+    elapsed = time.perf_counter() - started
+
+    snapshot = metrics.snapshot()
+    results.put(
+        {
+            "ok": ok,
+            "elapsed_seconds": elapsed,
+            "peak_rss_mb": peak_rss_mb(),
+            "metrics": snapshot,
+            "errors": [m for m in messages if "ERROR" in m][:5],
+        }
+    )
+
+
+def summarize(rows, sentences, outcome):
+    elapsed = outcome["elapsed_seconds"]
+    stages = outcome["metrics"]["stages"]
+    counters = outcome["metrics"]["counters"]
+    clips = stages.get("tts_request", {}).get("count", 0) - counters.get(
+        "tts_retries", 0
+    )
+    packaging = stages.get("deck_packaging", {}).get("total_seconds")
+    return {
+        "rows": rows,
+        "sentences_per_row": sentences,
+        "ok": outcome["ok"],
+        "elapsed_seconds": round(elapsed, 3),
+        "words_per_minute": round(rows / elapsed * 60, 1),
+        "clips_per_minute": round(clips / elapsed * 60, 1),
+        "clips": clips,
+        "peak_rss_mb": outcome["peak_rss_mb"],
+        "deck_packaging_seconds": packaging,
+        "llm_retries": counters.get("llm_retries", 0),
+        "tts_retries": counters.get("tts_retries", 0),
+        "stages": {
+            stage: {
+                "count": data["count"],
+                "mean_seconds": data["mean_seconds"],
+                "max_seconds": data["max_seconds"],
+            }
+            for stage, data in stages.items()
+        },
+        "errors": outcome["errors"],
+    }
+
+
+def compare(baseline_path, report):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {r["rows"]: r for r in baseline.get("results", [])}
+
+    print(f"\nCompared with {baseline.get('commit')} ({baseline_path}):")
+    for result in report["results"]:
+        old = previous.get(result["rows"])
+        if not old:
+            continue
+        line = [f"  {result['rows']:>6} rows:"]
+        for key in (
+            "words_per_minute",
+            "clips_per_minute",
+            "peak_rss_mb",
+            "deck_packaging_seconds",
+        ):
+            if old.get(key) and result.get(key) is not None:
+                change = (result[key] - old[key]) / old[key] * 100
+                line.append(f"{key} {old[key]} -> {result[key]} ({change:+.1f}%)")
+        print("  ".join(line))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measures run_pipeline throughput against local fake LLM/TTS backends."
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[100, 1000],
+        help="Vocabulary sizes to benchmark (default: 100 1000; up to 50000)",
+    )
+    parser.add_argument("--sentences", type=int, default=5, help="Sentences per word")
+    parser.add_argument("--provider", choices=["openai", "claude"], default="openai")
+    parser.add_argument("--audio", choices=["edge_tts", "openai"], default="edge_tts")
+    parser.add_argument("--batch", action="store_true", help="Use the batch APIs")
+    parser.add_argument(
+        "--stream-audio",
+        action="store_true",
+        help="Stream gpt-4o audio to WAV (with --audio openai)",
+    )
+    parser.add_argument("--pack", type=int, default=1, help="Words per AI request")
+    parser.add_argument("--llm-concurrency", type=int, default=5)
+    parser.add_argument("--tts-concurrency", type=int, default=8)
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="Mean fake LLM latency (s)"
+    )
+    parser.add_argument(
+        "--tts-latency", type=float, default=0.05, help="Mean fake TTS latency (s)"
+    )
+    parser.add_argument("--jitter", type=float, default=0.05, help="+/- seconds")
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Share of fake requests that fail with 429/503 (0-1)",
+    )
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="Result JSON path (default: benchmarks/results/<commit>_<timestamp>.json)",
+    )
+    parser.add_argument(
+        "--compare", metavar="BASELINE_JSON", help="Print deltas against a result file"
+    )
+    args = parser.parse_args()
+
+    server = FakeBackendServer(
+        BackendProfile(args.latency, args.jitter, args.error_rate, args.seed)
+    ).start()
+    tts_profile = {
+        "latency": args.tts_latency,
+        "jitter": min(args.jitter, args.tts_latency),
+        "error_rate": args.error_rate,
+        "seed": args.seed,
+    }
+    context = multiprocessing.get_context("spawn")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare")
+        },
+        "results": [],
+    }
+
+    try:
+        for rows in args.rows:
+            with tempfile.TemporaryDirectory(prefix="vocab_bench_") as workdir:
+                csv_path = prepare_workdir(workdir, rows, args, server)
+                results = context.Queue()
+                process = context.Process(
+                    target=run_case,
+                    args=(workdir, csv_path, args.batch, tts_profile, results),
+                )
+                process.start()
+                outcome = results.get()
+                process.join()
+
+            result = summarize(rows, args.sentences, outcome)
+            report["results"].append(result)
+            print(
+                f"{rows:>6} rows: {result['elapsed_seconds']}s, "
+                f"{result['words_per_minute']} words/min, "
+                f"{result['clips_per_minute']} clips/min, "
+                f"peak RSS {result['peak_rss_mb']} MB, "
+                f"packaging {result['deck_packaging_seconds']}s"
+                + ("" if result["ok"] else f" FAILED: {result['errors']}")
+            )
+    finally:
+        server.stop()
+
+    output = args.output or str(
+        RESULTS_DIR
+        / f"{report['commit']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
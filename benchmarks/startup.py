@@ -0,0 +1,78 @@
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+################################
+# Startup Time Check           #
+################################
+
+# Importing the package must stay cheap: provider SDKs and genanki are only
+# loaded when a run actually uses them. This measures the import cost in fresh
+# interpreters and fails if it exceeds the budget or a lazy module is loaded
+# eagerly again.
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+LAZY_MODULES = ("openai", "anthropic", "edge_tts", "genanki")
+ENTRY_POINTS = ("vocab_audio_automator.cli", "vocab_audio_automator.core")
+
+
+def timed_run(code):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise Exception(f"'{code}' failed:\n{result.stderr}")
+    return elapsed, result.stdout
+
+
+def median_ms(code, runs):
+    return statistics.median(timed_run(code)[0] for _ in range(runs)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Checks how long importing the package takes in a fresh interpreter."
+    )
+    parser.add_argument("--runs", type=int, default=7, help="Runs per measurement")
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=250,
+        help="Fail if an import costs more than this on top of a bare interpreter",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    baseline = median_ms("pass", args.runs)
+    print(f"Bare interpreter: {baseline:.0f} ms")
+
+    for module in ENTRY_POINTS:
+        cost = median_ms(f"import {module}", args.runs) - baseline
+        _, output = timed_run(
+            f"import sys, json, {module}; "
+            f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+        )
+        eager = json.loads(output)
+        status = "ok"
+        if cost > args.max_ms:
+            status = f"TOO SLOW (budget {args.max_ms:.0f} ms)"
+            failed = True
+        if eager:
+            status = f"loads {', '.join(eager)} at import"
+            failed = True
+        print(f"import {module}: +{cost:.0f} ms, {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import json
+import asyncio
+
+################################
+# Batch API (OpenAI & Claude)  #
+################################
+
+# Both providers answer batches within 24h at roughly half the price of
+# regular requests. Results are matched back to prompts by custom_id.
+# Every API call goes through retry (see resilience.call_with_retry), so one
+# 5xx or dropped connection during hours of polling doesn't end the run.
+
+
+async def _call(retry, operation):
+    return await (retry(operation) if retry else operation())
+
+
+async def submit_openai_batch(
+    client, model_id, max_tokens, system_prompt, requests, retry=None
+):
+    """Uploads {custom_id: prompt} as a JSONL batch file and starts the batch."""
+    lines = [
+        json.dumps(
+            {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model_id,
+                    "max_completion_tokens": max_tokens,
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt},
+                    ],
+                },
+            },
+            ensure_ascii=False,
+        )
+        for custom_id, prompt in requests.items()
+    ]
+    batch_file = await _call(
+        retry,
+        lambda: client.files.create(
+            file=("batch_input.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch",
+        ),
+    )
+    batch = await _call(
+        retry,
+        lambda: client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        ),
+    )
+    return batch.id
+
+
+async def wait_openai_batch(
+    client, batch_id, status_callback, poll_interval, retry=None
+):
+    """Polls until the batch is finished, returns {custom_id: response text}."""
+    while True:
+        batch = await _call(retry, lambda: client.batches.retrieve(batch_id))
+        if batch.status in ("completed", "expired"):
+            break
+        if batch.status in ("failed", "cancelled", "cancelling"):
+            raise Exception(
+                f"OpenAI batch {batch_id} ended with status '{batch.status}'."
+            )
+
+        counts = batch.request_counts
+        progress = f" ({counts.completed}/{counts.total})" if counts else ""
+        status_callback(f"Batch {batch_id}: {batch.status}{progress}...")
+        await asyncio.sleep(poll_interval)
+
+    results = {}
+    # Expired batches still deliver the requests that finished in time.
+    if batch.output_file_id:
+        content = await _call(retry, lambda: client.files.content(batch.output_file_id))
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if response.get("status_code") == 200:
+                body = response["body"]
+                results[item["custom_id"]] = body["choices"][0]["message"]["content"]
+    return results
+
+
+async def submit_claude_batch(
+    client, model_id, max_tokens, system_prompt, requests, retry=None
+):
+    """Creates a Message Batch from {custom_id: prompt}."""
+    batch_requests = [
+        {
+            "custom_id": custom_id,
+            "params": {
+                "model": model_id,
+                "max_tokens": max_tokens,
+                "system": system_prompt,
+                "messages": [{"role": "user", "content": prompt}],
+            },
+        }
+        for custom_id, prompt in requests.items()
+    ]
+    batch = await _call(
+        retry, lambda: client.messages.batches.create(requests=batch_requests)
+    )
+    return batch.id
+
+
+async def wait_claude_batch(
+    client, batch_id, status_callback, poll_interval, retry=None
+):
+    """Polls until the batch has ended, returns {custom_id: response text}."""
+    while True:
+        batch = await _call(retry, lambda: client.messages.batches.retrieve(batch_id))
+        if batch.processing_status == "ended":
+            break
+
+        counts = batch.request_counts
+        status_callback(
+            f"Batch {batch_id}: {counts.processing} processing, {counts.succeeded} done..."
+        )
+        await asyncio.sleep(poll_interval)
+
+    async def _collect():
+        # Read as a whole, so a stream that breaks off is fetched again.
+        results = {}
+        async for entry in await client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = entry.result.message.content[0].text
+        return results
+
+    return await _call(retry, _collect)
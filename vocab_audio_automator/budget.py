@@ -0,0 +1,261 @@
+import math
+from dataclasses import dataclass, field
+
+from .control import RunStopped
+from .metrics import format_duration
+from .prompts import estimate_tokens, token_counting
+
+################################
+# Cost Estimation & Budget     #
+################################
+
+# Prices come from pricing.models (USD per million tokens, keyed by model id).
+# A dry run projects a whole run from its prompt plan: input tokens per
+# prompt, output tokens from the number of sentences asked for, and speech
+# length (which OpenAI bills as audio tokens) from the sentence length.
+# During a run the same prices turn the token usage the providers report into
+# spend, and budget.max_usd stops the run like the Stop button once it is used
+# up. Requests reserve their worst case before they are sent, so the cap is
+# never crossed; requests already on their way finish and are kept.
+
+
+@dataclass(slots=True)
+class Estimate:
+    prompts: int = 0
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    clips: int = 0
+    audio_seconds: float = 0.0
+    text_models: list = field(default_factory=list)
+    audio_model: str = ""
+    text_cost: float | None = 0.0
+    audio_cost: float | None = 0.0
+    # Lower bound from generation.requests_per_minute / tokens_per_minute.
+    minutes: float | None = None
+    token_counting: str = ""
+    unpriced: list = field(default_factory=list)
+
+    @property
+    def cost(self):
+        if self.text_cost is None or self.audio_cost is None:
+            return None
+        return self.text_cost + self.audio_cost
+
+
+class Pricing:
+    """The prices and projections that apply to one run's settings."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.pricing = settings.pricing
+
+    def completion_cost(self, model_id, input_tokens, output_tokens, batch=False):
+        """USD for one completion, None if the model has no price."""
+        price = self.pricing.price(model_id)
+        if price is None:
+            return None
+        cost = (input_tokens * price.input + output_tokens * price.output) / 1_000_000
+        return cost * (1 - self.pricing.batch_discount) if batch else cost
+
+    def projected_completion_cost(self, model_id, input_tokens, sentences, batch=False):
+        """USD for completions asking for sentences sentence pairs in total."""
+        output_tokens = sentences * self.pricing.output_tokens_per_sentence
+        return self.completion_cost(model_id, input_tokens, output_tokens, batch)
+
+    def speech_seconds(self, chars):
+        return chars / self.pricing.speech_chars_per_second
+
+    def speech_cost(self, clips, chars):
+        """USD for synthesizing clips with chars characters of text in total."""
+        if self.settings.model.audio != "openai":
+            return 0.0
+        # Every request repeats the voice instructions next to the sentence.
+        instructions = estimate_tokens(self.settings.prompts.audio_instructions)
+        return self.completion_cost(
+            self.settings.openai.audio.model_id,
+            clips * instructions + chars // 4,
+            self.speech_seconds(chars) * self.pricing.audio_tokens_per_second,
+        )
+
+
+def estimate_cost(settings, prompt_tokens, clips, clip_chars=None, use_batch=False):
+    """Projects a run from its prompt plan (see PromptCompiler.plan).
+
+    clips is the number of sentences to synthesize; without clip_chars (their
+    total length, known in audio-only runs) the sentences are assumed to be as
+    long as pricing.output_tokens_per_sentence implies. Completion cache hits
+    and deduplicated sentences are not known up front, so this is an upper
+    bound.
+    """
+    pricing = Pricing(settings)
+    per_sentence = settings.pricing.output_tokens_per_sentence
+    pack_size = settings.generation.pack_size
+    estimate = Estimate(
+        prompts=len(prompt_tokens),
+        requests=math.ceil(len(prompt_tokens) / pack_size),
+        input_tokens=sum(prompt_tokens),
+        output_tokens=clips * per_sentence if prompt_tokens else 0,
+        clips=clips,
+        audio_model=settings.audio_model_id or settings.model.audio,
+        token_counting=token_counting(),
+    )
+
+    if prompt_tokens:
+        # Batches go to the configured provider only, never to the pool.
+        estimate.text_models = (
+            [settings.sentence_model_id] if use_batch else settings.sentence_model_ids
+        )
+        costs = []
+        for model_id in dict.fromkeys(estimate.text_models):
+            cost = pricing.projected_completion_cost(
+                model_id, estimate.input_tokens, clips, use_batch
+            )
+            if cost is None:
+                estimate.unpriced.append(model_id)
+            costs.append(cost)
+        # With a pool the requests are spread unevenly; assume the priciest member.
+        estimate.text_cost = None if None in costs else max(costs)
+
+        limits = settings.generation
+        max_tokens = (
+            settings.openai.sentence_generation.max_tokens
+            if settings.model.sentence_generation == "openai"
+            else settings.claude.max_tokens
+        )
+        bounds = []
+        if limits.requests_per_minute:
+            bounds.append(estimate.requests / limits.requests_per_minute)
+        if limits.tokens_per_minute:
+            reserved = estimate.input_tokens + estimate.prompts * max_tokens
+            bounds.append(reserved / limits.tokens_per_minute)
+        if bounds and not use_batch:
+            estimate.minutes = max(bounds)
+
+    if clip_chars is None:
+        # The target half of a "target | source" pair, at ~4 characters per token.
+        clip_chars = clips * per_sentence * 2
+    estimate.audio_seconds = pricing.speech_seconds(clip_chars)
+    estimate.audio_cost = pricing.speech_cost(clips, clip_chars)
+    if estimate.audio_cost is None:
+        estimate.unpriced.append(estimate.audio_model)
+    return estimate
+
+
+def format_usd(amount):
+    if amount is None:
+        return "unknown"
+    return f"${amount:.4f}" if 0 < amount < 1 else f"${amount:,.2f}"
+
+
+def format_estimate(estimate, use_batch=False, costs=True):
+    """The estimate as report lines; without costs only the size of the run."""
+    lines = []
+    if estimate.prompts:
+        lines.append(
+            f"Prompts: {estimate.prompts} in {estimate.requests} request(s), "
+            f"≈{estimate.input_tokens:,} input and ≈{estimate.output_tokens:,} output tokens"
+        )
+        lines.append(f"Input tokens: {estimate.token_counting}")
+    lines.append(
+        f"Audio: {estimate.clips} clip(s), ≈{format_duration(estimate.audio_seconds)} of speech"
+    )
+    if not costs:
+        return lines
+    if estimate.prompts:
+        label = ", ".join(estimate.text_models) + (" batch" if use_batch else "")
+        lines.append(f"Text cost ({label}): ≈{format_usd(estimate.text_cost)}")
+    lines.append(
+        f"Audio cost ({estimate.audio_model}): ≈{format_usd(estimate.audio_cost)}"
+    )
+    lines.append(
+        f"Total: ≈{format_usd(estimate.cost)} (before completion cache hits and deduplication)"
+    )
+    if estimate.unpriced:
+        lines.append(
+            f"No price in pricing.models for: {', '.join(dict.fromkeys(estimate.unpriced))}"
+        )
+    if use_batch and estimate.prompts:
+        lines.append("Duration: up to 24h, depending on the provider's batch queue")
+    elif estimate.minutes is not None:
+        lines.append(
+            f"Duration: at least ≈{format_duration(estimate.minutes * 60)} of sentence "
+            "generation at the configured rate limits"
+        )
+    return lines
+
+
+class Budget:
+    """Adds up what one run spends and stops it once budget.max_usd is used up.
+
+    Every request reserves its projected cost right before it is sent (each
+    retry and failover again), and the reservation is settled with the actual
+    cost once it returns. A request that would not fit is never sent, so
+    neither retries nor requests racing each other can overshoot the cap.
+    """
+
+    def __init__(self, settings, control, status_callback=print):
+        self.pricing = Pricing(settings)
+        self.limit = settings.budget.max_usd
+        self.control = control
+        self.status_callback = status_callback
+        self.spent = 0.0
+        self.reserved = 0.0
+        self.exhausted = False
+
+    def allows(self, cost):
+        return (
+            self.limit is None
+            or cost is None
+            or self.spent + self.reserved + cost <= self.limit
+        )
+
+    def _exhaust(self):
+        if self.exhausted:
+            return
+        self.exhausted = True
+        self.status_callback(
+            f"Budget of {format_usd(self.limit)} used up ({format_usd(self.spent)} spent). "
+            "Stopping: no further requests are sent."
+        )
+        self.control.stop()
+
+    def reserve(self, cost):
+        """Sets cost aside for a request about to be sent and returns the reservation.
+
+        Raises RunStopped instead when the run is stopped or the request
+        would not fit into what is left of the budget.
+        """
+        if self.control.stopped:
+            raise RunStopped("The run was stopped.")
+        cost = cost or 0.0
+        if not self.allows(cost):
+            self._exhaust()
+            raise RunStopped("The budget is used up.")
+        self.reserved += cost
+        return cost
+
+    def settle(self, reservation, cost):
+        """Replaces a reservation with what the request actually cost (0 if it failed)."""
+        self.reserved -= reservation
+        self.charge(cost)
+
+    def charge(self, cost):
+        if not cost:
+            return
+        self.spent += cost
+        if self.limit is not None and self.spent >= self.limit:
+            self._exhaust()
+
+    def reserve_completion(self, model_id, input_tokens, max_tokens, batch=False):
+        return self.reserve(
+            self.pricing.completion_cost(model_id, input_tokens, max_tokens, batch)
+        )
+
+    def completion_cost(self, model_id, input_tokens, output_tokens, batch=False):
+        return self.pricing.completion_cost(
+            model_id, input_tokens, output_tokens, batch
+        )
+
+    def reserve_clip(self, text):
+        return self.reserve(self.pricing.speech_cost(1, len(text)))
@@ -0,0 +1,235 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import unicodedata
+
+################################
+# Audio Cache                  #
+################################
+
+
+def normalize_text(text):
+    # Same sentence with different whitespace/unicode forms -> same clip
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def audio_cache_key(text, engine, model_id, voice):
+    payload = "\x1f".join([normalize_text(text), engine, model_id or "", voice])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Streamed gpt-4o audio arrives as raw PCM and is stored as WAV, all else is MP3.
+AUDIO_EXTENSIONS = (".mp3", ".wav")
+
+
+def audio_extension(config):
+    audio_cfg = (config.get("openai") or {}).get("audio") or {}
+    if config["model"]["audio"] == "openai" and audio_cfg.get("stream"):
+        return ".wav"
+    return ".mp3"
+
+
+def pick_voice(text, voices):
+    # Same sentence -> same voice on every run, spread evenly over all voices.
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+    return voices[int.from_bytes(digest[:4], "big") % len(voices)]
+
+
+def media_path(audio_folder, base_name, key, extension=".mp3"):
+    """Output path of a clip: <audio_folder>/<key[:2]>/<base_name>_<key[:16]>.mp3.
+
+    The name only depends on text, engine, model and voice, so parallel
+    syntheses never collide and re-runs produce the same names. Sharding by
+    key prefix keeps single directories small for 100k+ clips; the file names
+    alone stay unique for Anki's flat media folder.
+    """
+    return os.path.join(audio_folder, key[:2], f"{base_name}_{key[:16]}{extension}")
+
+
+class AudioCache:
+    """Content-addressed clip store with least-recently-used eviction.
+
+    Clips live under <cache_dir>/audio/<key[:2]>/<key>.mp3. Every hit
+    refreshes the file's mtime, which is what prune() sorts by.
+    """
+
+    def __init__(self, cache_dir, max_bytes=None, extension=".mp3"):
+        self.root = os.path.join(cache_dir, "audio")
+        self.max_bytes = max_bytes
+        self.extension = extension
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], key + self.extension)
+
+    def lookup(self, text, engine, model_id, voices):
+        """Returns (key, path, voice) of a cached clip for any of the voices."""
+        for voice in voices:
+            key = audio_cache_key(text, engine, model_id, voice)
+            path = self.path_for(key)
+            if os.path.exists(path):
+                os.utime(path)
+                return key, path, voice
+        return None, None, None
+
+    def store(self, key, source_path):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def _entries(self):
+        if not os.path.isdir(self.root):
+            return []
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(AUDIO_EXTENSIONS):
+                    continue
+                stat = os.stat(os.path.join(dirpath, name))
+                entries.append(
+                    (stat.st_mtime, stat.st_size, os.path.join(dirpath, name))
+                )
+        return entries
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "path": self.root,
+            "files": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    def prune(self, max_bytes=None):
+        """Evicts least recently used clips until the cache fits max_bytes."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        if limit is None:
+            return 0, 0
+
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed, freed = 0, 0
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+        return removed, freed
+
+
+################################
+# Completion Cache             #
+################################
+
+
+class CompletionCache:
+    """SQLite store of AI responses keyed by provider, model and both prompts."""
+
+    def __init__(self, db_path, ttl_seconds=None):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(provider, model_id, system_prompt, prompt):
+        payload = "\x1f".join([provider, model_id, system_prompt, prompt])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, provider, model_id, system_prompt, prompt):
+        row = self._conn.execute(
+            "SELECT response, created_at FROM completions WHERE key = ?",
+            (self.key(provider, model_id, system_prompt, prompt),),
+        ).fetchone()
+        if row is None:
+            return None
+        response, created_at = row
+        if self.ttl_seconds and time.time() - created_at > self.ttl_seconds:
+            return None
+        return response
+
+    def put(self, provider, model_id, system_prompt, prompt, response):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO completions (key, response, created_at) VALUES (?, ?, ?)",
+            (
+                self.key(provider, model_id, system_prompt, prompt),
+                response,
+                time.time(),
+            ),
+        )
+        self._conn.commit()
+
+    def stats(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        return {
+            "path": self.db_path,
+            "entries": count,
+            "bytes": os.path.getsize(self.db_path),
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    def prune(self):
+        """Deletes expired responses, returns how many were removed."""
+        if not self.ttl_seconds:
+            return 0
+        cursor = self._conn.execute(
+            "DELETE FROM completions WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+        self._conn.commit()
+        self._conn.execute("VACUUM")
+        return cursor.rowcount
+
+    def close(self):
+        self._conn.close()
+
+
+################################
+# Factories                    #
+################################
+
+
+def resolve_cache_dir(config, base_dir):
+    """Absolute path of the cache folder (cache.dir, relative to base_dir)."""
+    cache_dir = config.get("cache", {}).get("dir", ".cache")
+    if not os.path.isabs(cache_dir):
+        cache_dir = os.path.join(base_dir, cache_dir)
+    return cache_dir
+
+
+def open_audio_cache(config, base_dir):
+    """Builds the AudioCache described by the config, or None if it is disabled."""
+    audio_cfg = config.get("cache", {}).get("audio", {})
+    if not audio_cfg.get("enabled", True):
+        return None
+
+    cache_dir = resolve_cache_dir(config, base_dir)
+    max_size_mb = audio_cfg.get("max_size_mb")
+    max_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+    return AudioCache(cache_dir, max_bytes=max_bytes, extension=audio_extension(config))
+
+
+def open_completion_cache(config, base_dir):
+    """Builds the CompletionCache described by the config, or None if it is disabled."""
+    completions_cfg = config.get("cache", {}).get("completions", {})
+    if not completions_cfg.get("enabled", True):
+        return None
+
+    ttl_days = completions_cfg.get("ttl_days")
+    ttl_seconds = ttl_days * 24 * 60 * 60 if ttl_days else None
+    db_path = os.path.join(resolve_cache_dir(config, base_dir), "completions.sqlite3")
+    return CompletionCache(db_path, ttl_seconds=ttl_seconds)
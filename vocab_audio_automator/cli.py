@@ -1,12 +1,159 @@
+import sys
+import signal
+import threading
 import argparse
-from .core import run_pipeline
+from .control import RunControl
+from .budget import format_estimate
+from .core import run_pipeline, load_config, get_base_dir, estimate_run
+from .cache import open_audio_cache, open_completion_cache
+from .metrics import Metrics, serve_prometheus
+from .daemon import serve
+
+# Exit codes of a run that was stopped before it finished.
+EXIT_INTERRUPTED = 130  # Ctrl+C (128 + SIGINT), as shells report it
+EXIT_BUDGET = 3  # budget.max_usd used up
+
+
+def add_config_argument(parser):
+    parser.add_argument(
+        "--config",
+        metavar="PATH",
+        default=None,
+        help="Configuration file to use (default: config.yaml)",
+    )
+
+
+def cache_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="anki-cli cache",
+        description="Inspect or prune the local audio and AI response caches.",
+    )
+    parser.add_argument("action", choices=["stats", "prune"])
+    parser.add_argument(
+        "--max-size-mb",
+        type=float,
+        default=None,
+        help="Prune down to this size instead of cache.audio.max_size_mb",
+    )
+    add_config_argument(parser)
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    audio_cache = open_audio_cache(config, get_base_dir())
+    completion_cache = open_completion_cache(config, get_base_dir())
+
+    if args.action == "prune":
+        if completion_cache:
+            expired = completion_cache.prune()
+            print(f"Removed {expired} expired AI response(s).")
+        if audio_cache:
+            max_bytes = (
+                int(args.max_size_mb * 1024 * 1024)
+                if args.max_size_mb is not None
+                else None
+            )
+            if max_bytes is None and audio_cache.max_bytes is None:
+                print(
+                    "No audio size limit given (use --max-size-mb or cache.audio.max_size_mb)."
+                )
+            else:
+                removed, freed = audio_cache.prune(max_bytes)
+                print(
+                    f"Removed {removed} clip(s), freed {freed / (1024 * 1024):.1f} MB."
+                )
+
+    if audio_cache:
+        stats = audio_cache.stats()
+        print(f"Audio cache: {stats['path']}")
+        print(f"  Clips: {stats['files']}")
+        print(f"  Size:  {stats['bytes'] / (1024 * 1024):.1f} MB")
+        if stats["max_bytes"]:
+            print(f"  Limit: {stats['max_bytes'] / (1024 * 1024):.1f} MB")
+    else:
+        print("Audio cache: disabled")
+
+    if completion_cache:
+        stats = completion_cache.stats()
+        print(f"AI response cache: {stats['path']}")
+        print(f"  Responses: {stats['entries']}")
+        print(f"  Size:      {stats['bytes'] / (1024 * 1024):.1f} MB")
+        if stats["ttl_seconds"]:
+            print(f"  TTL:       {stats['ttl_seconds'] / 86400:g} day(s)")
+        completion_cache.close()
+    else:
+        print("AI response cache: disabled")
+
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="anki-cli serve",
+        description="Runs queued jobs from a spool folder (and optionally HTTP) until stopped.",
+    )
+    parser.add_argument(
+        "--spool",
+        metavar="DIR",
+        default=None,
+        help="Spool folder to watch (default: serve.spool_dir)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=None,
+        help="Also accept jobs on http://127.0.0.1:PORT/jobs (default: serve.port)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        metavar="N",
+        default=None,
+        help="Jobs processed at the same time (default: serve.max_concurrent_jobs)",
+    )
+    add_config_argument(parser)
+    args = parser.parse_args(argv)
+    serve(
+        spool_dir=args.spool,
+        port=args.port,
+        max_jobs=args.jobs,
+        config_path=args.config,
+    )
+
+
+def stop_on_sigint(control):
+    """First Ctrl+C stops the run cleanly, a second one aborts at once.
+
+    Returns an Event that is set once Ctrl+C was pressed.
+    """
+    interrupted = threading.Event()
+
+    def _handler(signum, frame):
+        interrupted.set()
+        print(
+            "\nStopping: finishing requests in flight and writing a partial deck "
+            "(press Ctrl+C again to abort immediately)..."
+        )
+        control.stop()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    signal.signal(signal.SIGINT, _handler)
+    return interrupted
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "cache":
+        cache_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         description="Generates Anki Cards with Audio via LLMs."
     )
-    parser.add_argument("input_file", help="Path to the vocabulary CSV or text file")
+    parser.add_argument(
+        "input_file",
+        nargs="?",
+        help="Path to the vocabulary CSV or text file (not needed with --resume)",
+    )
     parser.add_argument(
         "-o",
         "--output",
@@ -32,18 +179,115 @@ def main():
         action="store_true",
         help="Skip text generation, read input_file as target|source text",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore the local audio and AI response caches for this run",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Send all prompts as one OpenAI/Anthropic batch (cheaper, can take hours)",
+    )
+    parser.add_argument(
+        "--pack",
+        type=int,
+        metavar="N",
+        default=None,
+        help="Ask for N words per AI request (overrides generation.pack_size)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=None,
+        help="Only package notes and media not exported to this deck before",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_DIR|JOURNAL",
+        default=None,
+        help=(
+            "Continue an interrupted run: its journal_*.jsonl, or its output "
+            "directory (picks the latest unfinished run there)"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        default=None,
+        help="Serve live run metrics in Prometheus format on localhost:PORT/metrics",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Check the config and input and show the size of the run without calling any API",
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="Show the projected cost and duration (from pricing.*) before the run",
+    )
+    add_config_argument(parser)
 
     args = parser.parse_args()
+    if not args.input_file and not args.resume:
+        parser.error("input_file is required unless --resume is given")
+    if (args.dry_run or args.estimate) and not args.input_file:
+        parser.error("--dry-run and --estimate need an input_file")
+
+    if args.dry_run or args.estimate:
+        try:
+            estimate = estimate_run(
+                args.input_file,
+                run_audio_only=args.audio_only,
+                use_batch=args.batch,
+                pack_size=args.pack,
+                config_path=args.config,
+            )
+        except Exception as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        print("--- Estimate ---" if args.estimate else "--- Dry run ---")
+        for line in format_estimate(estimate, args.batch, costs=args.estimate):
+            print(line)
+        if args.dry_run:
+            return
+
+    metrics = Metrics()
+    if args.metrics_port:
+        serve_prometheus(metrics, args.metrics_port)
+        print(f"Metrics: http://127.0.0.1:{args.metrics_port}/metrics")
+
+    control = RunControl()
+    interrupted = stop_on_sigint(control)
 
     print(f"--- Starting Anki Generator CLI ---")
-    run_pipeline(
-        args.input_file,
-        output_dir=args.output,
-        output_name=args.name,
-        target_deck_name=args.deck,
-        run_audio_only=args.audio_only,
-        status_callback=print,
-    )
+    try:
+        run_pipeline(
+            args.input_file,
+            output_dir=args.output,
+            output_name=args.name,
+            target_deck_name=args.deck,
+            run_audio_only=args.audio_only,
+            status_callback=print,
+            use_cache=not args.no_cache,
+            resume_dir=args.resume,
+            use_batch=args.batch,
+            pack_size=args.pack,
+            incremental=args.incremental,
+            metrics=metrics,
+            control=control,
+            config_path=args.config,
+        )
+    except KeyboardInterrupt:
+        print("Aborted. Finished work is journaled; continue it with --resume.")
+        sys.exit(EXIT_INTERRUPTED)
+    if interrupted.is_set():
+        sys.exit(EXIT_INTERRUPTED)
+    if control.stopped:
+        # Nothing else stops a CLI run: the budget ran out.
+        sys.exit(EXIT_BUDGET)
 
 
 if __name__ == "__main__":
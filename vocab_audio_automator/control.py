@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+################################
+# Run Control (Stop / Pause)   #
+################################
+
+# The GUI and the CLI signal handler drive a run from outside its event loop,
+# so the flags are threading.Events and the pipeline polls them at checkpoints:
+# before a new AI request is sent and before a TTS worker takes the next
+# sentence. Requests that are already running are never interrupted; they
+# finish, get journaled and end up in the (partial) deck.
+
+POLL_INTERVAL = 0.2
+
+
+class RunStopped(Exception):
+    """Raised instead of sending a request once the run is stopped (or out of budget)."""
+
+
+class RunControl:
+    """Cooperative stop and pause/resume for one run; safe to use from any thread."""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set() and not self.stopped
+
+    def stop(self):
+        self._stop.set()
+        # A paused run has to wake up to notice the stop.
+        self._running.set()
+
+    def pause(self):
+        if not self.stopped:
+            self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    async def checkpoint(self):
+        """Waits while paused; returns False once the run should stop."""
+        while not self._running.is_set():
+            await asyncio.sleep(POLL_INTERVAL)
+        return not self._stop.is_set()
+
+    async def wait_stopped(self):
+        while not self._stop.is_set():
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def unless_stopped(self, awaitable):
+        """Awaits awaitable, or abandons it when the run is stopped first.
+
+        Returns (True, result) if it finished and (False, None) if it was
+        abandoned. Meant for long waits (provider batches) that hold no
+        in-flight work of their own.
+        """
+        task = asyncio.ensure_future(awaitable)
+        stopper = asyncio.ensure_future(self.wait_stopped())
+        try:
+            await asyncio.wait({task, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            task.cancel()
+            raise
+        finally:
+            stopper.cancel()
+        if task.done():
+            return True, task.result()
+        task.cancel()
+        return False, None
@@ -2,42 +2,75 @@ import os
 import csv
 import sys
 import time
-import yaml
-import random
+import wave
 import base64
+import copy
+import shutil
 import asyncio
-from datetime import datetime
+from collections import deque
 from pathlib import Path
+from array import array
 
-import genanki
-import edge_tts
-from openai import OpenAI
-from anthropic import Anthropic
 from dotenv import load_dotenv
 
+from .budget import Budget, estimate_cost, format_usd
+from .cache import (
+    audio_cache_key,
+    audio_extension,
+    media_path,
+    open_audio_cache,
+    pick_voice,
+    open_completion_cache,
+    resolve_cache_dir,
+)
+from .control import RunControl, RunStopped
+from .journal import RunJournal, run_stamp
+from .packing import build_packed_prompt, parse_packed_response
+from .prompts import PromptCompiler, estimate_tokens, target_count
+from .deck import DeckBuilder, open_deck_manifest
+from .dedup import open_sentence_index
+from .metrics import Metrics
+from .pool import build_client_pool, make_client
+from .settings import load_settings, parse_settings
+from .resilience import (
+    PERMANENT,
+    RATE_LIMITED,
+    RetryPolicy,
+    call_with_retry,
+    classify_error,
+    get_breaker,
+)
+from .batch import (
+    submit_openai_batch,
+    wait_openai_batch,
+    submit_claude_batch,
+    wait_claude_batch,
+)
+
 ################################
 # Configuration & Setup        #
 ################################
 
 
-def load_config(config_path="config.yaml"):
-    try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f)
-    except FileNotFoundError:
-        raise Exception(f"Configuration file '{config_path}' not found.")
-    except yaml.YAMLError as exc:
-        raise Exception(f"Error parsing YAML config: {exc}")
+def load_config(config_path=None):
+    """Returns a copy of the validated config dict (see settings.load_settings)."""
+    return copy.deepcopy(load_settings(config_path).raw)
 
 
-def initialize_clients(config):
-    # Ensure we look for the .env in the exact same directory as the executable/script
+def get_base_dir():
+    # Ensure we look for the .env (and caches) in the exact same directory as the executable/script
     if getattr(sys, "frozen", False):
-        base_dir = os.path.dirname(sys.executable)
-    else:
-        base_dir = os.getcwd()
+        return os.path.dirname(sys.executable)
+    return os.getcwd()
+
+
+def _base_url(config, provider):
+    # Optional endpoint override (proxies, self-hosted gateways, local fakes).
+    return (config.get(provider) or {}).get("base_url") or None
+
 
-    env_path = os.path.join(base_dir, ".env")
+def initialize_clients(config):
+    env_path = os.path.join(get_base_dir(), ".env")
     load_dotenv(dotenv_path=env_path, override=True)
 
     active_ai = config.get("model", {}).get("sentence_generation", "openai").lower()
@@ -47,44 +80,123 @@ def initialize_clients(config):
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise Exception(f"Missing OPENAI_API_KEY in {env_path}")
-        clients["openai"] = OpenAI(api_key=api_key)
+        clients["openai"] = make_client("openai", api_key, _base_url(config, "openai"))
 
     elif active_ai == "claude":
         api_key = os.getenv("ANTHROPIC_API_KEY")
         if not api_key:
             raise Exception(f"Missing ANTHROPIC_API_KEY in {env_path}")
-        clients["claude"] = Anthropic(api_key=api_key)
+        clients["claude"] = make_client("claude", api_key, _base_url(config, "claude"))
     else:
         raise Exception(f"Invalid sentence_generation model in config: {active_ai}.")
 
     return clients, active_ai
 
 
+def initialize_audio_client(config, clients):
+    """Returns clients plus the OpenAI client OpenAI TTS needs (if not there yet)."""
+    if config["model"]["audio"] != "openai" or "openai" in clients:
+        return clients
+
+    env_path = os.path.join(get_base_dir(), ".env")
+    load_dotenv(dotenv_path=env_path, override=True)
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise Exception(f"Missing OPENAI_API_KEY in {env_path} for Audio Generation.")
+    return {
+        **clients,
+        "openai": make_client("openai", api_key, _base_url(config, "openai")),
+    }
+
+
 ################################
 # Utility Functions            #
 ################################
 
 
-def get_data_from_file(file_path, status_callback=print):
-    status_callback(f"Reading txt data from file: {file_path}")
+def parse_sentence_pairs(text):
+    """Extracts (target, source) pairs from 'target | source' lines."""
     results = []
+    for line in text.splitlines():
+        clean_line = line.strip()
+        if "|" in clean_line:
+            target, source = clean_line.split("|", 1)
+            results.append((target.strip(), source.strip()))
+    return results
+
+
+def iter_data_from_file(file_path, status_callback=print):
+    """Yields (target, source) pairs line by line, without loading the whole file."""
+    status_callback(f"Reading txt data from file: {file_path}")
 
     if not os.path.exists(file_path):
         raise Exception(f"The file '{file_path}' was not found.")
 
     with open(file_path, "r", encoding="utf-8") as f:
         for line in f:
-            clean_line = line.strip()
-            if "|" in clean_line:
-                target, source = clean_line.split("|", 1)
-                results.append((target.strip(), source.strip()))
+            yield from parse_sentence_pairs(line)
 
-    return results
 
+def count_sentence_pairs(file_path):
+    if not os.path.exists(file_path):
+        raise Exception(f"The file '{file_path}' was not found.")
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if "|" in line)
+
+
+################################
+# Concurrency & Rate Limiting  #
+################################
+
+
+class RateLimiter:
+    """Sliding one-minute window limiting both requests and estimated tokens."""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, window=60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._events = deque()
+        self._tokens_in_window = 0
+        self._lock = asyncio.Lock()
+
+    def _prune(self, now):
+        while self._events and now - self._events[0][0] >= self.window:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def _has_room(self, tokens):
+        if self.requests_per_minute and len(self._events) >= self.requests_per_minute:
+            return False
+        # A single request larger than the whole budget is let through on an empty window.
+        if (
+            self.tokens_per_minute
+            and self._events
+            and self._tokens_in_window + tokens > self.tokens_per_minute
+        ):
+            return False
+        return True
+
+    @classmethod
+    def from_config(cls, config):
+        generation_cfg = config.get("generation", {})
+        return cls(
+            requests_per_minute=generation_cfg.get("requests_per_minute"),
+            tokens_per_minute=generation_cfg.get("tokens_per_minute"),
+        )
 
-def gen_unique_filename(base_name="audio", extension=".mp3"):
-    timestamp = int(time.time() * 1000)
-    return f"{base_name}_{timestamp}{extension}"
+    async def acquire(self, tokens=0):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                if self._has_room(tokens):
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                wait = self.window - (now - self._events[0][0])
+                await asyncio.sleep(max(wait, 0.01))
 
 
 ################################
@@ -92,127 +204,655 @@ def gen_unique_filename(base_name="audio", extension=".mp3"):
 ################################
 
 
-def process_vocabulary(csv_path):
-    global_words_string = ""
-    vocab_to_process = []
+def iter_vocabulary(csv_path):
+    """Yields the word rows of the vocabulary CSV one at a time (!GLOBAL rows excluded)."""
+    try:
+        with open(csv_path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                word = row.get("word", "").strip()
+                if word and word.upper() != "!GLOBAL":
+                    yield row
+    except FileNotFoundError:
+        raise Exception(f"CSV file '{csv_path}' not found.")
+
+
+def scan_vocabulary(csv_path, config):
+    """One streaming pass over the CSV: (global words, number of words, expected clips).
 
+    The !GLOBAL row may appear anywhere, so it has to be known before the
+    first prompt is built; the counts drive the progress bar.
+    """
+    global_words_string = ""
+    words = 0
+    clips = 0
     try:
         with open(csv_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
+            for row in csv.DictReader(f):
                 word = row.get("word", "").strip()
                 if not word:
                     continue
                 if word.upper() == "!GLOBAL":
                     global_words_string = row.get("bonus_words", "").strip()
                     continue
-                vocab_to_process.append(row)
+                words += 1
+                clips += _target_count(row, config)
     except FileNotFoundError:
         raise Exception(f"CSV file '{csv_path}' not found.")
 
-    return vocab_to_process, global_words_string
+    return global_words_string, words, clips
+
 
+def estimate_run(
+    input_path,
+    run_audio_only=False,
+    use_batch=False,
+    pack_size=None,
+    config_path=None,
+    status_callback=print,
+):
+    """Projects requests, tokens, clips, cost and duration of a run without any API call."""
+    config = load_config(config_path)
+    if pack_size is not None:
+        config.setdefault("generation", {})["pack_size"] = pack_size
+    settings = parse_settings(config, source=config_path or "config.yaml")
+    if run_audio_only:
+        clips = chars = 0
+        for target, _ in iter_data_from_file(input_path, status_callback):
+            clips += 1
+            chars += len(target)
+        return estimate_cost(settings, array("I"), clips, clip_chars=chars)
+
+    global_words_string, _, clips = scan_vocabulary(input_path, config)
+    compiler = PromptCompiler(settings, global_words_string)
+    prompt_tokens = compiler.plan(
+        iter_vocabulary(input_path), settings.prompts.system_prompt
+    )
+    return estimate_cost(settings, prompt_tokens, clips, use_batch=use_batch)
 
-def build_prompts(vocab_to_process, global_words_string, config, status_callback=print):
-    final_prompts = {}
-    global_text = ""
 
-    if global_words_string:
-        global_text = config["prompts"]["global_words_addon"].format(
-            global_words=global_words_string
-        )
+def _target_count(row, config):
+    return target_count(row, config["defaults"]["number_of_sentences"])
 
-    for row in vocab_to_process:
-        word = row.get("word", "").strip()
 
-        raw_count = row.get("count", "").strip()
+async def fetch_ai_completion(
+    clients,
+    active_ai,
+    config,
+    system_prompt,
+    user_prompt,
+    status_callback,
+    max_retries=None,
+    max_tokens=None,
+    metrics=None,
+    pool=None,
+    budget=None,
+):
+    """Requests one completion, from the client pool if one is given.
+
+    Returns (text, pool member that answered), or (None, None) on failure.
+    Every attempt reserves its worst case (prompt + max_tokens) in the budget
+    before it is sent and is charged the usage the provider reports.
+    """
+    metrics = metrics or Metrics()
+    pool = pool or build_client_pool(config, clients, active_ai)
+    policy = RetryPolicy.from_config(config, "generation")
+    if max_retries is not None:
+        policy.max_retries = max_retries
+
+    async def _request(member):
+        request_max_tokens = max_tokens or _completion_max_tokens(
+            config, member.provider
+        )
+        prompt_tokens = estimate_tokens(system_prompt + user_prompt)
+        # Raises RunStopped (never retried) once the run is stopped or out of budget.
+        reservation = (
+            budget.reserve_completion(
+                member.model_id, prompt_tokens, request_max_tokens
+            )
+            if budget
+            else 0.0
+        )
         try:
-            target_count = (
-                int(raw_count)
-                if raw_count
-                else config["defaults"]["number_of_sentences"]
+            with metrics.span("llm_request"):
+                text, tokens = await member.complete(
+                    system_prompt, user_prompt, request_max_tokens
+                )
+        except BaseException:
+            if budget:
+                # Failed requests are not billed.
+                budget.settle(reservation, 0.0)
+            raise
+        if tokens:
+            metrics.inc("llm_input_tokens", tokens[0])
+            metrics.inc("llm_output_tokens", tokens[1])
+        if budget:
+            # Without reported usage, the cost is estimated from the text.
+            input_tokens, output_tokens = tokens or (
+                prompt_tokens,
+                estimate_tokens(text or ""),
+            )
+            budget.settle(
+                reservation,
+                budget.completion_cost(member.model_id, input_tokens, output_tokens),
             )
-        except ValueError:
-            target_count = config["defaults"]["number_of_sentences"]
+        return text, member
 
+    def _on_failover(member, fallback, error):
+        metrics.inc("llm_failovers")
         status_callback(
-            f"--> INFO: Requesting exactly {target_count} sentence(s) for '{word}'."
+            f"  [!] {member.name} failed ({error}), trying {fallback.name}..."
         )
 
-        local_text = ""
-        bonus_words = row.get("bonus_words", "").strip()
-        if bonus_words:
-            mode = row.get("bonus_mode", "").strip() or "all"
-            if mode == "all":
-                local_text = config["prompts"]["bonus_words_all"].format(
-                    extra_words=bonus_words
-                )
-            elif mode == "some":
-                local_text = config["prompts"]["bonus_words_some"].format(
-                    extra_words=bonus_words
-                )
+    def _on_retry(attempt, error, kind, delay):
+        metrics.inc("llm_retries")
+        reason = "Rate limited" if kind == RATE_LIMITED else "Failed"
+        status_callback(
+            f"  [!] {reason} on attempt {attempt + 1} ({error}), retrying in {delay:.1f}s..."
+        )
 
-        combined_optional_instructions = f"{global_text}\n{local_text}".strip()
-        row_setting = row.get("setting", "").strip()
-        final_setting = row_setting if row_setting else config["defaults"]["setting"]
-
-        final_prompt = config["prompts"]["sentence_generation"].format(
-            number_of_sentences=target_count,
-            target_language=config["defaults"]["target_language"],
-            source_language=config["defaults"]["source_language"],
-            language_level=config["defaults"]["level"],
-            setting=final_setting,
-            target_word=word,
-            optional_instruction=combined_optional_instructions,
+    try:
+        # Breakers live on the pool members; the pool fails over between them.
+        return await call_with_retry(
+            lambda: pool.call(_request, on_failover=_on_failover),
+            policy,
+            on_retry=_on_retry,
         )
+    except RunStopped:
+        return None, None
+    except Exception as e:
+        if classify_error(e) == PERMANENT:
+            status_callback(f"  [X] Request rejected, not retrying: {e}")
+        else:
+            status_callback(f"  [X] Max retries reached ({e}). Moving to next word.")
+        return None, None
+
+
+def _completion_model_id(config, active_ai):
+    if active_ai == "openai":
+        return config["openai"]["sentence_generation"]["model_id"]
+    return config["claude"]["model_id"]
+
+
+def _completion_max_tokens(config, active_ai):
+    if active_ai == "openai":
+        section = config.get("openai", {}).get("sentence_generation", {})
+    else:
+        section = config.get("claude", {})
+    return section.get("max_tokens", 1000)
 
-        final_prompt += f"\n\nCRITICAL SYSTEM OVERRIDE: You MUST output EXACTLY {target_count} sentence pair(s). Do NOT output more. Do NOT output less."
-        final_prompts[word] = final_prompt
 
-    return final_prompts
+# Generation progress lines are rate-limited to one per STATUS_INTERVAL seconds.
+STATUS_INTERVAL = 1.0
 
 
-def fetch_ai_completion(
+async def generate_sentences(
     clients,
     active_ai,
     config,
     system_prompt,
-    user_prompt,
-    status_callback,
-    max_retries=3,
+    jobs,
+    output_filename,
+    status_callback=print,
+    on_complete=None,
+    completion_cache=None,
+    journal=None,
+    on_result=None,
+    metrics=None,
+    total=None,
+    pool=None,
+    limiter=None,
+    control=None,
+    compiler=None,
+    budget=None,
 ):
-    for attempt in range(max_retries):
+    """Runs the (word, fields) jobs concurrently and appends the results in input order.
+
+    jobs is consumed lazily: only a bounded window of requests runs ahead of
+    the word currently being written, and prompts are rendered right before
+    they are sent, so memory does not grow with the size of the vocabulary.
+    Every response is also handed to the async on_result(word, text) callback
+    as soon as it is written, so later stages can start right away.
+    Prompts already answered in the completion_cache skip the API (and the
+    rate limiter) entirely. Every row is its own job, also when a word is
+    repeated; jobs the journal marks as written are skipped.
+    With generation.pack_size > 1, several words share one request; words
+    whose part of the answer is invalid are retried alone. Requests are spread
+    over the members of the client pool (just the configured provider unless
+    pool.members is set). Once the control is stopped (also by the budget
+    running out) no new request is sent; requests already running finish and
+    are written as usual.
+    """
+    generation_cfg = config.get("generation", {})
+    concurrency = max(1, int(generation_cfg.get("concurrency", 5)))
+    limiter = limiter or RateLimiter.from_config(config)
+    semaphore = asyncio.Semaphore(concurrency)
+    max_tokens = _completion_max_tokens(config, active_ai)
+    model_id = _completion_model_id(config, active_ai)
+    pack_size = max(1, int(generation_cfg.get("pack_size", 1) or 1))
+    packing = pack_size > 1
+    total_label = total if total is not None else "?"
+    requested = 0
+    cache_hits = 0
+    metrics = metrics or Metrics()
+    pool = pool or build_client_pool(config, clients, active_ai)
+    control = control or RunControl()
+    compiler = compiler or PromptCompiler(parse_settings(config))
+    last_status = 0.0
+    # Responses are cached under the pool member that answered; lookups try
+    # the configured model first, then the other members.
+    cache_models = list(
+        dict.fromkeys(
+            [(active_ai, model_id)] + [(m.provider, m.model_id) for m in pool.members]
+        )
+    )
+
+    def _cached(prompt):
+        if not completion_cache:
+            return None
+        for provider, cached_model_id in cache_models:
+            cached = completion_cache.get(
+                provider, cached_model_id, system_prompt, prompt
+            )
+            if cached is not None:
+                return cached
+        return None
+
+    def _report(message):
+        # One line per request floods the log on big runs; one per second is plenty.
+        nonlocal last_status
+        now = time.monotonic()
+        if now - last_status >= STATUS_INTERVAL:
+            last_status = now
+            status_callback(message)
+
+    async def _generate(i, word, fields, prompt=None):
+        nonlocal cache_hits
+        prompt = prompt or compiler.render(word, fields)
+        cached = _cached(prompt)
+        if cached is not None:
+            cache_hits += 1
+            return cached
+
+        if not await control.checkpoint():
+            return None
+        async with semaphore:
+            # The limiter can hold a request for up to a minute; a stop must not wait for it.
+            prompt_tokens = fields.get("prompt_tokens") or estimate_tokens(
+                system_prompt + prompt
+            )
+            acquired, _ = await control.unless_stopped(
+                limiter.acquire(prompt_tokens + max_tokens)
+            )
+            if not acquired or control.stopped:
+                return None
+            _report(
+                f"Generating {fields['target_count']} sentence(s) for '{word}' ({i+1}/{total_label})..."
+            )
+            result_text, member = await fetch_ai_completion(
+                clients,
+                active_ai,
+                config,
+                system_prompt,
+                prompt,
+                status_callback,
+                metrics=metrics,
+                pool=pool,
+                budget=budget,
+            )
+        if result_text and completion_cache:
+            completion_cache.put(
+                member.provider, member.model_id, system_prompt, prompt, result_text
+            )
+        return result_text
+
+    async def _generate_pack(group):
+        nonlocal cache_hits
+        results = {}
+        entries = {}
+        prompts = {}
+        for (i, word, fields), prompt in zip(
+            group, compiler.render_many((word, fields) for _, word, fields in group)
+        ):
+            prompts[i] = prompt
+            cached = _cached(prompt)
+            if cached is not None:
+                cache_hits += 1
+                results[i] = cached
+            else:
+                entries[f"w{i}"] = (word, fields)
+        if not entries:
+            return results
+
+        if not await control.checkpoint():
+            return results
+        packed_prompt = build_packed_prompt(entries, config)
+        pack_max_tokens = max_tokens * len(entries)
+        async with semaphore:
+            acquired, _ = await control.unless_stopped(
+                limiter.acquire(
+                    estimate_tokens(system_prompt + packed_prompt) + pack_max_tokens
+                )
+            )
+            if not acquired or control.stopped:
+                return results
+            _report(
+                f"Generating sentences for {len(entries)} words "
+                f"({', '.join(word for word, _ in entries.values())})..."
+            )
+            response, member = await fetch_ai_completion(
+                clients,
+                active_ai,
+                config,
+                system_prompt,
+                packed_prompt,
+                status_callback,
+                max_tokens=pack_max_tokens,
+                metrics=metrics,
+                pool=pool,
+                budget=budget,
+            )
+
+        parsed = parse_packed_response(response, entries)
+        retry = []
+        for task_id, (word, fields) in entries.items():
+            i = int(task_id[1:])
+            if task_id not in parsed:
+                retry.append((i, word, fields))
+                continue
+            results[i] = parsed[task_id]
+            if completion_cache:
+                completion_cache.put(
+                    member.provider,
+                    member.model_id,
+                    system_prompt,
+                    prompts[i],
+                    parsed[task_id],
+                )
+
+        if retry:
+            status_callback(
+                f"  [!] {len(retry)} word(s) missing or invalid in packed response, retrying individually..."
+            )
+            retried = await asyncio.gather(
+                *(_generate(i, word, fields, prompts[i]) for i, word, fields in retry)
+            )
+            for (i, _, _), result_text in zip(retry, retried):
+                if result_text:
+                    results[i] = result_text
+        return results
+
+    done = journal.completed_jobs() if journal else {}
+    if done:
+        status_callback(f"Resuming: {len(done)} word(s) already generated.")
+
+    # Slots are the rows in input order; pending ones are collected into
+    # groups (one row, or pack_size rows) that become a single request task.
+    jobs = enumerate(jobs)
+    lookahead = concurrency * 2 * pack_size
+    slots = deque()
+    group = []
+
+    def _flush():
+        if not group:
+            return
+        if packing:
+            task = asyncio.create_task(
+                _generate_pack([(i, word, fields) for i, word, fields, _ in group])
+            )
+        else:
+            i, word, fields, _ = group[0]
+            task = asyncio.create_task(_generate(i, word, fields))
+        for *_, slot in group:
+            slot["task"] = task
+        group.clear()
+
+    def _fill():
+        nonlocal requested
+        if control.stopped:
+            return
+        for i, (word, fields) in jobs:
+            # Journals written before rows became jobs are keyed by word.
+            slot = {"job": i, "word": word, "task": None}
+            slot["done"] = done.get(i, done.get(word))
+            slots.append(slot)
+            if slot["done"] is None:
+                requested += 1
+                group.append((i, word, fields, slot))
+                if len(group) >= pack_size:
+                    _flush()
+            if len(slots) >= lookahead:
+                return
+        _flush()
+
+    try:
+        with open(output_filename, "a", encoding="utf-8") as output_file:
+            _fill()
+            # Awaiting in input order keeps the file ordered while later words
+            # are already being generated in the background.
+            while slots:
+                slot = slots.popleft()
+                i, word = slot["job"], slot["word"]
+                if slot["done"] is not None:
+                    result_text = slot["done"]
+                else:
+                    if slot["task"] is None:
+                        if control.stopped:
+                            continue
+                        _flush()
+                    result_text = await slot["task"]
+                    if packing:
+                        result_text = result_text.get(i)
+                    if result_text:
+                        output_file.write(result_text + "\n")
+                        output_file.flush()
+                        if journal:
+                            journal.record(
+                                "completion", word=word, job=i, text=result_text
+                            )
+                if result_text and on_result:
+                    await on_result(word, result_text)
+                if on_complete:
+                    on_complete()
+                _fill()
+    finally:
+        for slot in slots:
+            if slot["task"]:
+                slot["task"].cancel()
+
+    if len(pool.members) > 1:
+        status_callback(
+            "Client pool: "
+            + ", ".join(f"{m.name} {m.requests}" for m in pool.members)
+            + f" request(s), {pool.failovers} failover(s)."
+        )
+    if completion_cache:
+        metrics.inc("completion_cache_hits", cache_hits)
+        status_callback(
+            f"Completion cache: reused {cache_hits}/{requested} response(s)."
+        )
+
+
+async def generate_sentences_batch(
+    clients,
+    active_ai,
+    config,
+    system_prompt,
+    jobs,
+    output_filename,
+    status_callback=print,
+    on_complete=None,
+    completion_cache=None,
+    journal=None,
+    on_result=None,
+    metrics=None,
+    control=None,
+    compiler=None,
+    budget=None,
+):
+    """Sends all (word, fields) jobs as one provider batch and appends the results in input order.
+
+    The batch id is journaled right after submission, so a resumed run keeps
+    polling the same batch instead of paying for a second one. Unlike
+    generate_sentences this holds every prompt in memory: the batch input has
+    to be uploaded in one piece anyway. Stopping the control stops the waiting,
+    not the batch: a resumed run collects its results. A batch whose worst
+    case (prompts + max_tokens each) does not fit into the budget is not
+    submitted.
+    """
+    model_id = _completion_model_id(config, active_ai)
+    control = control or RunControl()
+    compiler = compiler or PromptCompiler(parse_settings(config))
+    poll_interval = config.get("batch", {}).get("poll_interval_seconds", 60)
+    policy = RetryPolicy.from_config(config, "generation")
+    breaker = get_breaker(active_ai, config)
+
+    def _on_retry(attempt, error, kind, delay):
+        reason = "Rate limited" if kind == RATE_LIMITED else "Failed"
+        status_callback(
+            f"  [!] {reason} batch API call on attempt {attempt + 1} ({error}), "
+            f"retrying in {delay:.1f}s..."
+        )
+
+    def _retry(operation):
+        return call_with_retry(operation, policy, breaker, on_retry=_on_retry)
+
+    done = journal.completed_jobs() if journal else {}
+    if done:
+        status_callback(f"Resuming: {len(done)} word(s) already generated.")
+
+    results = {}
+    pending = {}
+    jobs = list(jobs)
+    # Journals written before rows became jobs are keyed by word.
+    journaled = [done.get(i, done.get(word)) for i, (word, _) in enumerate(jobs)]
+    open_rows = [i for i, text in enumerate(journaled) if text is None]
+    prompts = compiler.render_many(jobs[i] for i in open_rows)
+    for i, prompt in zip(open_rows, prompts):
+        cached = (
+            completion_cache.get(active_ai, model_id, system_prompt, prompt)
+            if completion_cache
+            else None
+        )
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending[f"word-{i}"] = (i, prompt)
+
+    open_batch = journal.open_batch(active_ai) if journal and pending else None
+    resuming = bool(open_batch) and set(pending) <= set(open_batch["custom_ids"])
+    reservation = 0.0
+    if pending and budget and not resuming:
+        # A batch is paid as a whole, so its worst case has to fit before it is sent.
         try:
+            reservation = budget.reserve_completion(
+                model_id,
+                sum(
+                    estimate_tokens(system_prompt + prompt)
+                    for _, prompt in pending.values()
+                ),
+                len(pending) * _completion_max_tokens(config, active_ai),
+                batch=True,
+            )
+        except RunStopped:
+            status_callback(
+                f"Batch of {len(pending)} prompt(s) does not fit into the budget of "
+                f"{format_usd(budget.limit)}. Not submitted."
+            )
+
+    if pending and await control.checkpoint():
+        if resuming:
+            batch_id = open_batch["id"]
+            status_callback(f"Resuming: polling existing batch {batch_id}...")
+        else:
+            requests = {cid: prompt for cid, (_, prompt) in pending.items()}
+            status_callback(
+                f"Submitting {len(requests)} prompt(s) as one {active_ai} batch..."
+            )
+            submit = (
+                submit_openai_batch if active_ai == "openai" else submit_claude_batch
+            )
+            batch_id = await submit(
+                clients[active_ai],
+                model_id,
+                _completion_max_tokens(config, active_ai),
+                system_prompt,
+                requests,
+                retry=_retry,
+            )
+            if journal:
+                journal.record(
+                    "batch", provider=active_ai, id=batch_id, custom_ids=list(requests)
+                )
+
+        with (metrics or Metrics()).span("llm_batch"):
             if active_ai == "openai":
-                model_id = config["openai"]["sentence_generation"]["model_id"]
-                response = clients["openai"].chat.completions.create(
-                    model=model_id,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt},
-                    ],
+                waiting = wait_openai_batch(
+                    clients["openai"],
+                    batch_id,
+                    status_callback,
+                    poll_interval,
+                    retry=_retry,
+                )
+            else:
+                waiting = wait_claude_batch(
+                    clients["claude"],
+                    batch_id,
+                    status_callback,
+                    poll_interval,
+                    retry=_retry,
                 )
-                return response.choices[0].message.content
-
-            elif active_ai == "claude":
-                model_id = config["claude"]["model_id"]
-                max_tokens = config.get("claude", {}).get("max_tokens", 1000)
-                response = clients["claude"].messages.create(
-                    model=model_id,
-                    max_tokens=max_tokens,
-                    system=system_prompt,
-                    messages=[{"role": "user", "content": user_prompt}],
+            collected, batch_results = await control.unless_stopped(waiting)
+        if collected and journal:
+            journal.record("batch_done", id=batch_id)
+        elif not collected:
+            status_callback(
+                f"Stopped waiting for batch {batch_id}. Resume this run to collect its results."
+            )
+            batch_results = {}
+
+        spent = 0.0
+        for custom_id, (i, prompt) in pending.items():
+            result_text = batch_results.get(custom_id)
+            if not result_text:
+                continue
+            results[i] = result_text
+            if completion_cache:
+                completion_cache.put(
+                    active_ai, model_id, system_prompt, prompt, result_text
+                )
+            if budget:
+                # Models without a price in pricing.models count as free.
+                spent += (
+                    budget.completion_cost(
+                        model_id,
+                        estimate_tokens(system_prompt + prompt),
+                        estimate_tokens(result_text),
+                        batch=True,
+                    )
+                    or 0.0
                 )
-                return response.content[0].text
 
-        except Exception as e:
-            status_callback(f"  [!] Attempt {attempt + 1} failed: {e}")
-            if attempt < max_retries - 1:
-                status_callback("  [*] Waiting 5 seconds before retrying...")
-                time.sleep(5)
-            else:
-                status_callback(f"  [X] Max retries reached. Moving to next word.")
-                return None
+        if budget:
+            # A batch that is no longer waited for still runs, and is paid, at the provider.
+            budget.settle(reservation, spent if collected else reservation)
+
+        failed = sum(1 for i, _ in pending.values() if i not in results)
+        if failed and collected:
+            status_callback(
+                f"  [!] {failed} batch request(s) failed. Resume this run to resubmit them."
+            )
+
+    with open(output_filename, "a", encoding="utf-8") as output_file:
+        for i, (word, _) in enumerate(jobs):
+            if i in results:
+                output_file.write(results[i] + "\n")
+                if journal:
+                    journal.record("completion", word=word, job=i, text=results[i])
+            result_text = journaled[i] or results.get(i)
+            if result_text and on_result:
+                await on_result(word, result_text)
+            if on_complete:
+                on_complete()
 
 
 ################################
@@ -220,28 +860,21 @@ def fetch_ai_completion(
 ################################
 
 
-def generate_audio_edge(text, filename, edge_tts_voices):
-    voice = random.choice(edge_tts_voices)
-
-    async def _generate():
-        communicate = edge_tts.Communicate(text, voice)
-        await communicate.save(filename)
+async def generate_audio_edge(text, filename, voice):
+    import edge_tts  # loaded on first use, see pool.make_client
 
-    asyncio.run(_generate())
+    communicate = edge_tts.Communicate(text, voice)
+    await communicate.save(filename)
     return voice
 
 
-def generate_audio_gpt4o(client, text, filename, config):
-    model_id = config["openai"]["audio"]["model_id"]
-    voice = random.choice(config["openai"]["audio"]["voices"])
-    audio_instructions = config["prompts"]["audio_instructions"]
-
-    response = client.chat.completions.create(
-        model=model_id,
+async def generate_audio_gpt4o(client, text, filename, settings, voice):
+    response = await client.chat.completions.create(
+        model=settings.openai.audio.model_id,
         modalities=["text", "audio"],
         audio={"voice": voice, "format": "mp3"},
         messages=[
-            {"role": "system", "content": audio_instructions},
+            {"role": "system", "content": settings.prompts.audio_instructions},
             {
                 "role": "user",
                 "content": f"Repeat this text exactly word-for-word: {text}",
@@ -255,12 +888,242 @@ def generate_audio_gpt4o(client, text, filename, config):
     return voice
 
 
+# gpt-4o streams raw 16-bit mono PCM at 24 kHz.
+PCM16_SAMPLE_RATE = 24000
+
+
+async def generate_audio_gpt4o_stream(client, text, filename, settings, voice):
+    """Streams gpt-4o audio straight into a WAV file.
+
+    Base64 chunks are decoded as they arrive (carrying over incomplete 4-char
+    groups), so memory stays flat no matter how long the clip is or how many
+    clips run in parallel.
+    """
+    stream = await client.chat.completions.create(
+        model=settings.openai.audio.model_id,
+        modalities=["text", "audio"],
+        audio={"voice": voice, "format": "pcm16"},
+        messages=[
+            {"role": "system", "content": settings.prompts.audio_instructions},
+            {
+                "role": "user",
+                "content": f"Repeat this text exactly word-for-word: {text}",
+            },
+        ],
+        stream=True,
+    )
+
+    pending = ""
+    received = 0
+    with wave.open(filename, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(PCM16_SAMPLE_RATE)
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            audio = getattr(chunk.choices[0].delta, "audio", None)
+            if isinstance(audio, dict):
+                data = audio.get("data")
+            else:
+                data = getattr(audio, "data", None)
+            if not data:
+                continue
+            pending += data
+            usable = len(pending) - len(pending) % 4
+            if usable:
+                pcm = base64.b64decode(pending[:usable])
+                wav.writeframes(pcm)
+                received += len(pcm)
+                pending = pending[usable:]
+
+    if not received:
+        raise Exception(f"No audio received for '{text[:30]}'.")
+    return voice
+
+
+class AudioSynthesizer:
+    """Turns (target, source) pairs into clips on the running event loop.
+
+    synthesize() can be called for many pairs at once; concurrency is bounded
+    globally and per voice, failed clips are retried with exponential backoff
+    and jitter. Voices and file names are derived from the sentence (see
+    cache.media_path). With an audio_cache, clips that were synthesized before
+    are copied over instead of generated again, and clips already recorded in
+    the journal are taken as they are.
+    """
+
+    def __init__(
+        self,
+        clients,
+        config,
+        audio_folder,
+        status_callback=print,
+        audio_cache=None,
+        journal=None,
+        metrics=None,
+        semaphore=None,
+        settings=None,
+        budget=None,
+    ):
+        # Everything the per-clip path needs is read once from the typed settings.
+        self.settings = settings or parse_settings(config)
+        self.audio_model = self.settings.model.audio
+        self.voices = self.settings.audio_voices
+        self.model_id = self.settings.audio_model_id
+
+        self.retry_policy = RetryPolicy.from_config(config, "tts", default_retries=4)
+        self.breaker = get_breaker(self.audio_model, config)
+        # A shared semaphore caps the clips of several runs at once (anki-cli serve).
+        self.semaphore = semaphore or asyncio.Semaphore(self.settings.tts.concurrency)
+        self.voice_semaphores = {
+            voice: asyncio.Semaphore(self.settings.tts.per_voice_concurrency)
+            for voice in self.voices
+        }
+
+        self.clients = clients
+        self.config = config
+        self.audio_folder = audio_folder
+        self.status_callback = status_callback
+        self.audio_cache = audio_cache
+        self.journal = journal
+        self.metrics = metrics or Metrics()
+        self.budget = budget
+        self.base_name = self.settings.defaults.target_language.replace(" ", "_")
+        self.extension = audio_extension(config)
+        self.stream_audio = self.extension == ".wav"
+        self.in_flight = {}
+        self.requested = 0
+        self.cache_hits = 0
+
+        self.done = journal.completed_clips() if journal else {}
+        if self.done:
+            status_callback(f"Resuming: {len(self.done)} clip(s) already synthesized.")
+
+    async def synthesize(self, i, target, source):
+        """Returns the look-up entry for one pair, or None if synthesis failed."""
+        if target in self.done:
+            return self.done[target]
+        self.requested += 1
+
+        entry = await self._synthesize(i, target, source)
+        if entry and self.journal:
+            self.journal.record_clip(target, source, entry[2], entry[3])
+        return entry
+
+    async def _synthesize(self, i, target, source):
+        voice = pick_voice(target, self.voices)
+        if self.audio_cache:
+            # Prefer the sentence's own voice, but take a clip in any configured voice.
+            key, cached_path, cached_voice = self.audio_cache.lookup(
+                target,
+                self.audio_model,
+                self.model_id,
+                [voice] + [v for v in self.voices if v != voice],
+            )
+            if cached_path:
+                file_path = media_path(
+                    self.audio_folder, self.base_name, key, self.extension
+                )
+                if not os.path.exists(file_path):
+                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                    shutil.copyfile(cached_path, file_path)
+                self.cache_hits += 1
+                return (target, source, file_path, cached_voice)
+
+        key = audio_cache_key(target, self.audio_model, self.model_id, voice)
+        file_path = media_path(self.audio_folder, self.base_name, key, self.extension)
+        # Identical sentences in one run share a single synthesis. Only running
+        # syntheses are tracked, so the dict doesn't grow with the run.
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                self._synthesize_clip(i, target, file_path, voice)
+            )
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        if not await task:
+            return None
+        if self.audio_cache:
+            self.audio_cache.store(key, file_path)
+        return (target, source, file_path, voice)
+
+    async def _synthesize_clip(self, i, target, file_path, voice):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # Written under a temporary name, so an interrupted clip never looks finished.
+        part_path = f"{file_path}.part"
+
+        async def _attempt():
+            # Slots are only held while a request runs, not during backoff. The
+            # voice comes first: waiting for a busy voice must not hold one of
+            # the global slots (shared by all jobs of anki-cli serve).
+            async with self.voice_semaphores[voice], self.semaphore:
+                # Raises RunStopped (never retried) once the run is stopped or out of budget.
+                reservation = self.budget.reserve_clip(target) if self.budget else 0.0
+                self.status_callback(f"Audio #{i+1}: {target[:30]}...")
+                try:
+                    with self.metrics.span("tts_request"):
+                        if self.stream_audio:
+                            await generate_audio_gpt4o_stream(
+                                self.clients["openai"],
+                                target,
+                                part_path,
+                                self.settings,
+                                voice,
+                            )
+                        elif self.audio_model == "openai":
+                            await generate_audio_gpt4o(
+                                self.clients["openai"],
+                                target,
+                                part_path,
+                                self.settings,
+                                voice,
+                            )
+                        else:
+                            await generate_audio_edge(target, part_path, voice)
+                except BaseException:
+                    if self.budget:
+                        self.budget.settle(reservation, 0.0)
+                    raise
+                if self.budget:
+                    # Clips are charged at their projected length.
+                    self.budget.settle(reservation, reservation)
+            os.replace(part_path, file_path)
+
+        def _on_retry(attempt, error, kind, delay):
+            self.metrics.inc("tts_retries")
+            self.status_callback(
+                f"  [!] Audio attempt {attempt + 1} failed ({error}), retrying in {delay:.1f}s..."
+            )
+
+        try:
+            await call_with_retry(
+                _attempt, self.retry_policy, self.breaker, on_retry=_on_retry
+            )
+        except RunStopped:
+            # Left for a resumed run.
+            return False
+        except Exception as e:
+            self.status_callback(f"  [X] Audio failed for '{target[:30]}': {e}")
+            return False
+        self.metrics.inc("audio_bytes_written", os.path.getsize(file_path))
+        return True
+
+    async def finish(self):
+        self.metrics.inc("audio_cache_hits", self.cache_hits)
+        if self.audio_cache:
+            self.status_callback(
+                f"Audio cache: reused {self.cache_hits}/{self.requested} clip(s)."
+            )
+            await asyncio.to_thread(self.audio_cache.prune)
+
+
 ################################
 # MAIN PIPELINE                #
 ################################
 
 
-def run_pipeline(
+async def run_pipeline_async(
     input_path,
     output_dir="outputs",
     output_name="AI_Generated_Sentences",
@@ -268,167 +1131,374 @@ def run_pipeline(
     run_audio_only=False,
     status_callback=print,
     progress_callback=None,
+    use_cache=True,
+    resume_dir=None,
+    use_batch=False,
+    pack_size=None,
+    incremental=None,
+    metrics=None,
+    config=None,
+    clients=None,
+    pool=None,
+    limiter=None,
+    tts_semaphore=None,
+    control=None,
+    config_path=None,
 ):
+    # A long-running caller (anki-cli serve) passes its config, warm clients
+    # and the limits shared by all of its runs; otherwise each run sets up its own.
+    journal = None
+    sentence_index = None
+    metrics = metrics or Metrics()
+    control = control or RunControl()
+    run_started = time.perf_counter()
     try:
         # --- PHASE 0: SETUP ---
+        if resume_dir:
+            journal = RunJournal.resume(resume_dir)
+            status_callback(f"Resuming run from journal: {journal.path}")
+            params = journal.params
+            input_path = params["input_path"]
+            output_dir = journal.run_dir
+            output_name = params["output_name"]
+            target_deck_name = params["target_deck_name"]
+            run_audio_only = params["run_audio_only"]
+
         status_callback("Loading configuration...")
-        config = load_config()
+        with metrics.span("config_load"):
+            if config is None:
+                config = load_config(config_path)
+            else:
+                # The overrides below must not leak into the caller's config.
+                config = copy.deepcopy(config)
+            if pack_size is not None:
+                config.setdefault("generation", {})["pack_size"] = pack_size
+            # Fails here, before any client, journal or request, if anything is off.
+            settings = parse_settings(config, source=config_path or "config.yaml")
+        budget = Budget(settings, control, status_callback)
 
         # Only initialize text generation clients if we are NOT in audio-only mode
         if not run_audio_only:
-            clients, active_ai = initialize_clients(config)
-            system_prompt = config["prompts"]["system_prompt"]
+            if clients is None:
+                clients, active_ai = initialize_clients(config)
+            else:
+                active_ai = settings.model.sentence_generation
+            pool = pool or build_client_pool(
+                config,
+                clients,
+                active_ai,
+                env_path=os.path.join(get_base_dir(), ".env"),
+            )
+            system_prompt = settings.prompts.system_prompt
         else:
             # We still need clients for audio if using OpenAI TTS, but we will init it below.
-            clients = {}
+            clients = clients or {}
             active_ai = "none"
 
+        clients = initialize_audio_client(config, clients)
+        audio_model = settings.model.audio
+
         audio_folder = os.path.join(output_dir, "audio")
         os.makedirs(audio_folder, exist_ok=True)
         current_step = 0
+        total_steps = 1
 
-        # --- PHASE 1: SENTENCE GENERATION (Or Bypass) ---
-        if not run_audio_only:
-            status_callback(f"Reading vocabulary from: {input_path}")
-            vocab_to_process, global_words_string = process_vocabulary(input_path)
-            final_prompts = build_prompts(
-                vocab_to_process, global_words_string, config, status_callback
+        if journal:
+            output_filename = journal.params["output_filename"]
+        elif run_audio_only:
+            output_filename = input_path  # The input file IS the text file
+        else:
+            output_filename = os.path.join(
+                output_dir, f"{active_ai}_output_{run_stamp()}.txt"
             )
 
-            total_steps = (len(final_prompts) * 2) + 1
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_filename = os.path.join(
-                output_dir, f"{active_ai}_output_{timestamp}.txt"
+        if journal is None:
+            journal = RunJournal.start(
+                output_dir,
+                input_path=os.path.abspath(input_path),
+                output_filename=os.path.abspath(output_filename),
+                output_name=output_name,
+                target_deck_name=target_deck_name,
+                run_audio_only=bool(run_audio_only),
+            )
+
+        final_deck_name = target_deck_name or settings.anki.deck_name
+        if incremental is None:
+            incremental = settings.anki.incremental
+        manifest = (
+            open_deck_manifest(
+                resolve_cache_dir(config, get_base_dir()), final_deck_name
             )
+            if incremental
+            else None
+        )
+        deck_builder = DeckBuilder(
+            config, final_deck_name, status_callback, manifest=manifest, metrics=metrics
+        )
+        sentence_index = open_sentence_index(config, get_base_dir(), final_deck_name)
+        synthesizer = AudioSynthesizer(
+            clients,
+            config,
+            audio_folder,
+            status_callback,
+            audio_cache=open_audio_cache(config, get_base_dir()) if use_cache else None,
+            journal=journal,
+            metrics=metrics,
+            semaphore=tts_semaphore,
+            settings=settings,
+            budget=budget,
+        )
 
-            with open(output_filename, "a", encoding="utf-8") as output_file:
-                for i, (word, prompt) in enumerate(final_prompts.items()):
+        def _advance():
+            nonlocal current_step
+            current_step += 1
+            if progress_callback:
+                progress_callback(min(current_step / total_steps, 1.0))
+
+        # The stages are connected by a bounded queue: every sentence pair parsed
+        # from an AI response goes straight to the TTS workers, and finished clips
+        # are added to the deck (in input order) while generation is still running.
+        worker_count = settings.tts.concurrency
+        pair_queue = asyncio.Queue(maxsize=settings.tts.queue_size)
+        finished = {}
+        next_seq = 0
+        enqueued = 0
+        lookup_path = os.path.join(audio_folder, "lookup_list.txt")
+        lookup_file = open(lookup_path, "w", encoding="utf-8")
+
+        async def _enqueue(target, source):
+            nonlocal enqueued
+            if control.stopped:
+                return
+            # Repeated sentences are dropped before they cost a synthesis or collide in Anki.
+            if sentence_index and sentence_index.check(target):
+                _advance()
+                return
+            await pair_queue.put((enqueued, target, source))
+            enqueued += 1
+
+        async def _enqueue_pairs(word, text):
+            for target, source in parse_sentence_pairs(text):
+                await _enqueue(target, source)
+
+        def _add(entry):
+            if entry:
+                target, source, audio_path, voice = entry
+                # Sentences count as seen once their note is written, not before.
+                if sentence_index and sentence_index.add(target):
+                    return
+                lookup_file.write(f"{target} | {source} | {audio_path} | {voice}\n")
+                deck_builder.add(entry)
+
+        def _assemble(seq, entry):
+            nonlocal next_seq
+            finished[seq] = entry
+            while next_seq in finished:
+                _add(finished.pop(next_seq))
+                next_seq += 1
+
+        async def _tts_worker():
+            while True:
+                item = await pair_queue.get()
+                if item is None:
+                    return
+                seq, target, source = item
+                if not await control.checkpoint():
+                    # Left for a resumed run; keep draining so the producer never blocks.
+                    if sentence_index:
+                        sentence_index.discard(target)
+                    continue
+                entry = await synthesizer.synthesize(seq, target, source)
+                if entry is None and sentence_index:
+                    sentence_index.discard(target)
+                _assemble(seq, entry)
+                _advance()
+
+        async def _produce():
+            nonlocal total_steps
+            # --- STAGE 1: SENTENCE GENERATION (Or Bypass) ---
+            if not run_audio_only:
+                status_callback(f"Reading vocabulary from: {input_path}")
+                with metrics.span("input_scan"):
+                    global_words_string, word_count, expected_clips = (
+                        await asyncio.to_thread(scan_vocabulary, input_path, config)
+                    )
+                total_steps = word_count + expected_clips + 1
+                compiler = PromptCompiler(settings, global_words_string)
+                with metrics.span("prompt_plan"):
+                    prompt_tokens = await asyncio.to_thread(
+                        compiler.plan, iter_vocabulary(input_path), system_prompt
+                    )
+                if prompt_tokens:
                     status_callback(
-                        f"Generating sentences for '{word}' ({i+1}/{len(final_prompts)})..."
+                        f"Prompts: {len(prompt_tokens)}, ~{sum(prompt_tokens)} input tokens "
+                        f"(avg {sum(prompt_tokens) // len(prompt_tokens)}, max {max(prompt_tokens)} per prompt)."
                     )
-                    result_text = fetch_ai_completion(
-                        clients,
-                        active_ai,
-                        config,
-                        system_prompt,
-                        prompt,
-                        status_callback,
+                if budget.limit is not None:
+                    projected = estimate_cost(
+                        settings, prompt_tokens, expected_clips, use_batch=use_batch
+                    ).cost
+                    status_callback(
+                        f"Budget: {format_usd(budget.limit)}, estimated cost ~{format_usd(projected)}."
                     )
-                    if result_text:
-                        output_file.write(result_text + "\n")
-
-                    current_step += 1
-                    if progress_callback:
-                        progress_callback(current_step / total_steps)
-                    time.sleep(1)
-        else:
+                    if projected > budget.limit:
+                        status_callback(
+                            "  [!] The estimate is above the budget; the run stops when the budget is used up."
+                        )
+                # Rows are read again and rendered only as generation needs them.
+                jobs = compiler.iter_jobs(iter_vocabulary(input_path), prompt_tokens)
+
+                completion_cache = (
+                    open_completion_cache(config, get_base_dir()) if use_cache else None
+                )
+                try:
+                    if use_batch:
+                        await generate_sentences_batch(
+                            clients,
+                            active_ai,
+                            config,
+                            system_prompt,
+                            jobs,
+                            output_filename,
+                            status_callback,
+                            on_complete=_advance,
+                            completion_cache=completion_cache,
+                            journal=journal,
+                            on_result=_enqueue_pairs,
+                            metrics=metrics,
+                            control=control,
+                            compiler=compiler,
+                            budget=budget,
+                        )
+                    else:
+                        await generate_sentences(
+                            clients,
+                            active_ai,
+                            config,
+                            system_prompt,
+                            jobs,
+                            output_filename,
+                            status_callback,
+                            on_complete=_advance,
+                            completion_cache=completion_cache,
+                            journal=journal,
+                            on_result=_enqueue_pairs,
+                            metrics=metrics,
+                            total=word_count,
+                            pool=pool,
+                            limiter=limiter,
+                            control=control,
+                            compiler=compiler,
+                            budget=budget,
+                        )
+                finally:
+                    if completion_cache:
+                        completion_cache.close()
+            else:
+                status_callback(
+                    f"Skipping Sentence Generation. Using provided text file..."
+                )
+                with metrics.span("input_scan"):
+                    total_steps = count_sentence_pairs(output_filename) + 1
+                for target, source in iter_data_from_file(
+                    output_filename, status_callback
+                ):
+                    if control.stopped:
+                        break
+                    await _enqueue(target, source)
+
+            for _ in range(worker_count):
+                await pair_queue.put(None)
+
+        # --- STAGE 2: AUDIO GENERATION (overlaps with stage 1) ---
+        status_callback(
+            f"Generating audio using '{audio_model}' while sentences arrive..."
+        )
+        tasks = [asyncio.create_task(_produce())]
+        tasks += [asyncio.create_task(_tts_worker()) for _ in range(worker_count)]
+        try:
+            await asyncio.gather(*tasks)
+            if control.stopped:
+                # Clips that finished after a skipped sentence still go into the deck.
+                for seq in sorted(finished):
+                    _add(finished.pop(seq))
+        finally:
+            for task in tasks:
+                task.cancel()
+            lookup_file.close()
+        await synthesizer.finish()
+        if budget.spent:
             status_callback(
-                f"Skipping Sentence Generation. Using provided text file..."
+                f"Spent ~{format_usd(budget.spent)}"
+                + (
+                    f" of the {format_usd(budget.limit)} budget."
+                    if budget.limit is not None
+                    else " (estimated from pricing.models)."
+                )
             )
-            output_filename = input_path  # The input file IS the text file
-
-        # --- PHASE 2: AUDIO GENERATION ---
-        status_callback("Fetching sentences for audio creation...")
-        results = get_data_from_file(output_filename, status_callback)
-
-        if run_audio_only:
-            total_steps = len(results) + 1  # Calculate progress bar for audio-only mode
-
-        audio_model = config["model"]["audio"]
-        target_language = config["defaults"]["target_language"]
-        look_up_list = []
-
-        if audio_model == "openai" and "openai" not in clients:
-            if getattr(sys, "frozen", False):
-                base_dir = os.path.dirname(sys.executable)
-            else:
-                base_dir = os.getcwd()
-            env_path = os.path.join(base_dir, ".env")
-            load_dotenv(dotenv_path=env_path, override=True)
-
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                raise Exception(
-                    f"Missing OPENAI_API_KEY in {env_path} for Audio Generation."
+        if sentence_index:
+            skipped = sentence_index.skipped
+            rejected = sentence_index.rejected
+            metrics.inc(
+                "dedup_duplicates", skipped["duplicate"] + rejected["duplicate"]
+            )
+            metrics.inc(
+                "dedup_near_duplicates",
+                skipped["near_duplicate"] + rejected["near_duplicate"],
+            )
+            metrics.inc("dedup_synthesis_avoided", sum(skipped.values()))
+            if skipped["duplicate"] or skipped["near_duplicate"]:
+                status_callback(
+                    f"Deduplication: skipped {skipped['duplicate']} duplicate and "
+                    f"{skipped['near_duplicate']} near-duplicate sentence(s), "
+                    f"{sum(skipped.values())} synthesis call(s) avoided."
                 )
-            clients["openai"] = OpenAI(api_key=api_key)
-
-        status_callback(f"Generating audio using '{audio_model}'...")
-        for i, (target, source) in enumerate(results):
-            file_name = gen_unique_filename(base_name=target_language.replace(" ", "_"))
-            file_path = os.path.join(audio_folder, file_name)
-
-            status_callback(f"Audio ({i+1}/{len(results)}): {target[:30]}...")
-
-            if audio_model == "openai":
-                voice = generate_audio_gpt4o(
-                    clients["openai"], target, file_path, config
+            if sum(rejected.values()):
+                # Copies synthesized at the same time: only the first one is kept.
+                status_callback(
+                    f"Deduplication: left out {sum(rejected.values())} more repeated "
+                    "sentence(s) that were synthesized alongside their first copy."
                 )
-            elif audio_model == "edge_tts":
-                edge_tts_voices = config["edge_tts"]["voices"]
-                voice = generate_audio_edge(target, file_path, edge_tts_voices)
-            else:
-                raise Exception(f"Unsupported audio model '{audio_model}' in config.")
-
-            look_up_list.append((target, source, file_path, voice))
-
-            current_step += 1
-            if progress_callback:
-                progress_callback(current_step / total_steps)
-
-        lookup_path = os.path.join(audio_folder, "lookup_list.txt")
-        with open(lookup_path, "w", encoding="utf-8") as f:
-            for target, source, audio_path, voice in look_up_list:
-                f.write(f"{target} | {source} | {audio_path} | {voice}\n")
 
-        # --- PHASE 3: ANKI DECK CREATION ---
+        # --- STAGE 3: ANKI DECK PACKAGING ---
+        clean_name = output_name.strip()
+        if clean_name.endswith(".apkg"):
+            clean_name = clean_name[: -len(".apkg")]
+        if control.stopped:
+            if not deck_builder.added:
+                status_callback("Stopped before any card was finished.")
+                status_callback(f'Resume with --resume "{journal.path}"')
+                return False
+            # The finished part of the run is delivered under its own name; the
+            # journal stays open-ended, so resuming builds the complete deck.
+            clean_name += "_partial"
+        clean_name += ".apkg"
         status_callback("Packaging Anki Deck...")
-        model_id = config["anki"]["model_id"]
-        final_deck_name = (
-            target_deck_name if target_deck_name else config["anki"]["deck_name"]
-        )
-
-        my_model = genanki.Model(
-            model_id,
-            final_deck_name,
-            fields=[{"name": "Front"}, {"name": "Back"}, {"name": "Audio"}],
-            templates=[
-                {
-                    "name": "Card 1",
-                    "qfmt": "{{Front}}<br><br>{{Audio}}",
-                    "afmt": '{{FrontSide}}<hr id="answer">{{Back}}',
-                }
-            ],
-            css=".card { font-family: arial; font-size: 20px; text-align: center; color: black; background-color: white; }",
-        )
-
-        my_deck = genanki.Deck(random.randrange(1 << 30, 1 << 31), final_deck_name)
-        media_files_to_export = []
 
-        for item in look_up_list:
-            front_text, back_text, audio_path, _ = item
-            audio_filename = os.path.basename(audio_path)
-            my_note = genanki.Note(
-                model=my_model,
-                fields=[front_text, back_text, f"[sound:{audio_filename}]"],
-                guid=genanki.guid_for(front_text),
+        with metrics.span("deck_packaging"):
+            # Off the event loop: daemon jobs share it and would stall meanwhile.
+            output_apkgs = await asyncio.to_thread(
+                deck_builder.write,
+                os.path.join(output_dir, clean_name),
+                # Like the sentence index below: a partial deck is built again
+                # in full by the resumed run.
+                update_manifest=not control.stopped,
             )
-            my_deck.add_note(my_note)
-            if os.path.exists(audio_path):
-                media_files_to_export.append(audio_path)
-            else:
-                status_callback(f"Warning: Audio file not found: {audio_path}")
-
-        clean_name = output_name.strip()
-        if not clean_name.endswith(".apkg"):
-            clean_name += ".apkg"
+        metrics.inc("deck_bytes_written", sum(os.path.getsize(p) for p in output_apkgs))
+        if sentence_index and not control.stopped:
+            # A partial deck is built again in full by the resumed run.
+            sentence_index.commit()
 
-        output_apkg = os.path.join(output_dir, clean_name)
-        my_package = genanki.Package(my_deck)
-        my_package.media_files = media_files_to_export
-        my_package.write_to_file(output_apkg)
+        if control.stopped:
+            status_callback(
+                f"Stopped. Partial deck with {deck_builder.added} note(s): "
+                f"{', '.join(output_apkgs)}"
+            )
+            status_callback(f'Resume with --resume "{journal.path}" to finish the run.')
+            return False
 
-        status_callback(f"Success! Deck created: {output_apkg}")
+        journal.record("done", apkg=output_apkgs)
+        status_callback(f"Success! Deck created: {', '.join(output_apkgs)}")
 
         if progress_callback:
             progress_callback(1.0)
@@ -436,4 +1506,58 @@ def run_pipeline(
 
     except Exception as e:
         status_callback(f"ERROR: {str(e)}")
+        if journal:
+            status_callback(f'Progress is saved. Resume with --resume "{journal.path}"')
         return False
+    finally:
+        metrics.observe("run", time.perf_counter() - run_started)
+        if sentence_index:
+            sentence_index.close()
+        if journal:
+            journal.close()
+            metrics_path = os.path.join(
+                os.path.dirname(journal.path),
+                f"metrics_{run_stamp()}.json",
+            )
+            metrics.write_json(metrics_path)
+            status_callback(f"Run metrics written to {metrics_path}")
+
+
+def run_pipeline(
+    input_path,
+    output_dir="outputs",
+    output_name="AI_Generated_Sentences",
+    target_deck_name=None,
+    run_audio_only=False,
+    status_callback=print,
+    progress_callback=None,
+    use_cache=True,
+    resume_dir=None,
+    use_batch=False,
+    pack_size=None,
+    incremental=None,
+    metrics=None,
+    control=None,
+    config_path=None,
+):
+    # Text generation and audio synthesis share one event loop, so the async
+    # clients and TTS connections live for the whole run.
+    return asyncio.run(
+        run_pipeline_async(
+            input_path,
+            output_dir=output_dir,
+            output_name=output_name,
+            target_deck_name=target_deck_name,
+            run_audio_only=run_audio_only,
+            status_callback=status_callback,
+            progress_callback=progress_callback,
+            use_cache=use_cache,
+            resume_dir=resume_dir,
+            use_batch=use_batch,
+            pack_size=pack_size,
+            incremental=incremental,
+            metrics=metrics,
+            control=control,
+            config_path=config_path,
+        )
+    )
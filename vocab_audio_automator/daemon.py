@@ -0,0 +1,395 @@
+import os
+import json
+import glob
+import shutil
+import asyncio
+import itertools
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .core import (
+    RateLimiter,
+    get_base_dir,
+    initialize_audio_client,
+    initialize_clients,
+    run_pipeline_async,
+)
+from .journal import RunJournal
+from .metrics import Metrics
+from .pool import build_client_pool
+from .settings import load_settings
+
+################################
+# Job Queue Daemon             #
+################################
+
+# `anki-cli serve` keeps one process (config, API clients, connection pools,
+# circuit breakers) alive for many runs. Jobs are JSON files in a spool
+# folder:
+#
+#   spool/incoming/   new jobs: <id>.json specs, or plain .csv files (defaults)
+#   spool/queued/     accepted, waiting for a free slot (highest priority first)
+#   spool/running/    being processed; picked up again (resumed) after a restart
+#   spool/done/       finished, with the written .apkg paths
+#   spool/failed/     the run reported an error, see the job's log
+#   spool/inputs/, outputs/<id>/, logs/<id>.log   dropped CSVs, results, run logs
+#
+# The optional HTTP endpoint only writes specs into incoming/, so both ways in
+# share the same bookkeeping.
+
+JOB_STATES = ("incoming", "queued", "running", "done", "failed")
+# Job spec keys and the run_pipeline_async arguments they map to.
+JOB_OPTIONS = {
+    "output": "output_dir",
+    "name": "output_name",
+    "deck": "target_deck_name",
+    "audio_only": "run_audio_only",
+    "batch": "use_batch",
+    "pack": "pack_size",
+    "incremental": "incremental",
+}
+_job_counter = itertools.count(1)
+
+
+def new_job_id(stem="job"):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{timestamp}_{next(_job_counter):04d}_{stem}"
+
+
+def _write_json(path, data):
+    # Written under a temporary name, so the watcher never reads half a spec.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class JobSpool:
+    """The spool folder: accepts, moves and lists jobs."""
+
+    def __init__(self, spool_dir):
+        self.spool_dir = os.path.abspath(spool_dir)
+        for state in JOB_STATES:
+            os.makedirs(os.path.join(self.spool_dir, state), exist_ok=True)
+        for folder in ("inputs", "outputs", "logs"):
+            os.makedirs(os.path.join(self.spool_dir, folder), exist_ok=True)
+
+    def path(self, state, job_id):
+        return os.path.join(self.spool_dir, state, f"{job_id}.json")
+
+    def submit(self, spec):
+        """Drops a job spec into incoming/ and returns its id."""
+        if not spec.get("input"):
+            raise Exception("A job needs an 'input' file.")
+        job_id = new_job_id()
+        _write_json(self.path("incoming", job_id), spec)
+        return job_id
+
+    def accept_incoming(self):
+        """Moves new specs (and bare CSV files) to queued/, returns the accepted jobs."""
+        accepted = []
+        incoming = os.path.join(self.spool_dir, "incoming")
+        for path in sorted(glob.glob(os.path.join(incoming, "*.csv"))):
+            # A bare CSV is a job with default settings; the file moves along.
+            job_id = new_job_id(os.path.splitext(os.path.basename(path))[0])
+            input_path = os.path.join(self.spool_dir, "inputs", f"{job_id}.csv")
+            shutil.move(path, input_path)
+            _write_json(self.path("incoming", job_id), {"input": input_path})
+
+        for path in sorted(glob.glob(os.path.join(incoming, "*.json"))):
+            job_id = os.path.splitext(os.path.basename(path))[0]
+            try:
+                spec = _read_json(path)
+                if not spec.get("input"):
+                    raise ValueError("missing 'input'")
+            except (ValueError, OSError) as e:
+                job = {"id": job_id, "error": f"Invalid job spec: {e}"}
+                _write_json(self.path("failed", job_id), job)
+                os.remove(path)
+                continue
+
+            job = {
+                **spec,
+                "id": job_id,
+                "input": os.path.abspath(spec["input"]),
+                "priority": int(spec.get("priority", 0)),
+                "submitted_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            job.setdefault("output", os.path.join(self.spool_dir, "outputs", job_id))
+            self.move(job, "incoming", "queued")
+            accepted.append(job)
+        return accepted
+
+    def move(self, job, old_state, new_state):
+        _write_json(self.path(new_state, job["id"]), job)
+        if os.path.exists(self.path(old_state, job["id"])):
+            os.remove(self.path(old_state, job["id"]))
+
+    def load(self, state):
+        jobs = []
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, state, "*.json"))):
+            try:
+                jobs.append(_read_json(path))
+            except (ValueError, OSError):
+                continue
+        return jobs
+
+    def find(self, job_id):
+        for state in JOB_STATES:
+            path = self.path(state, job_id)
+            if os.path.exists(path):
+                return {**_read_json(path), "state": state}
+        return None
+
+    def log_path(self, job_id):
+        return os.path.join(self.spool_dir, "logs", f"{job_id}.log")
+
+
+def serve_http(spool, port, host="127.0.0.1"):
+    """Accepts jobs on http://host:port/jobs in a background thread.
+
+    POST /jobs with a JSON job spec queues it; GET /jobs lists all jobs and
+    GET /jobs/<id> shows one.
+    """
+
+    class _Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                self._send(404, {"error": "unknown path"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                spec = json.loads(self.rfile.read(length) or b"{}")
+                job_id = spool.submit(spec)
+            except Exception as e:
+                self._send(400, {"error": str(e)})
+                return
+            self._send(202, {"id": job_id, "state": "incoming"})
+
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            if parts == ["jobs"]:
+                self._send(
+                    200,
+                    [
+                        {**job, "state": state}
+                        for state in JOB_STATES
+                        for job in spool.load(state)
+                    ],
+                )
+            elif len(parts) == 2 and parts[0] == "jobs":
+                job = spool.find(parts[1])
+                self._send(200 if job else 404, job or {"error": "unknown job"})
+            else:
+                self._send(404, {"error": "unknown path"})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class JobDaemon:
+    """Runs spooled jobs by priority, a limited number at a time.
+
+    All jobs share the API clients (with their connection pools), the client
+    pool, the sentence rate limiter and the TTS concurrency limit, so parallel
+    jobs together stay within the configured limits. Edits to the config file
+    apply from the next job on (prompts, defaults, deck settings...). A change
+    of provider, model or pool builds new clients for the next jobs; the rate
+    limit and TTS concurrency keep the values the daemon was started with.
+    """
+
+    def __init__(
+        self,
+        settings,
+        spool,
+        max_jobs=2,
+        poll_interval=2.0,
+        log=print,
+        config_path=None,
+    ):
+        self.settings = settings
+        self.config = settings.raw
+        self.config_path = config_path
+        self.spool = spool
+        self.max_jobs = max(1, max_jobs)
+        self.poll_interval = poll_interval
+        self.log = log
+        self.queue = asyncio.PriorityQueue()
+        self._order = itertools.count()
+
+        self.clients, self.pool = self._build_clients(self.config)
+        self.limiter = RateLimiter.from_config(self.config)
+        self.tts_semaphore = asyncio.Semaphore(settings.tts.concurrency)
+
+    @staticmethod
+    def _build_clients(config):
+        clients, active_ai = initialize_clients(config)
+        clients = initialize_audio_client(config, clients)
+        pool = build_client_pool(
+            config,
+            clients,
+            active_ai,
+            env_path=os.path.join(get_base_dir(), ".env"),
+        )
+        return clients, pool
+
+    @staticmethod
+    def _client_settings(settings):
+        # What the clients and the client pool are built from.
+        return (settings.model, settings.openai, settings.claude, settings.pool)
+
+    def _refresh_config(self):
+        # Cheap when nothing changed: load_settings only stats the file.
+        try:
+            settings = load_settings(self.config_path)
+        except Exception as e:
+            self.log(f"Config changed but is invalid, keeping the previous one:\n{e}")
+            return
+        if settings is self.settings:
+            return
+        note = ""
+        if self._client_settings(settings) != self._client_settings(self.settings):
+            # Jobs already running keep the clients they started with.
+            try:
+                self.clients, self.pool = self._build_clients(settings.raw)
+            except Exception as e:
+                self.log(
+                    "Config changed but its API clients could not be set up, "
+                    f"keeping the previous config:\n{e}"
+                )
+                return
+            note = " with new API clients"
+        self.settings = settings
+        self.config = settings.raw
+        self.log(f"Config file changed, reloaded{note} for the next jobs.")
+
+    def _enqueue(self, job):
+        # Highest priority first, then first come, first served.
+        self.queue.put_nowait((-job.get("priority", 0), next(self._order), job))
+
+    def recover(self):
+        """Re-queues jobs a previous daemon left queued or running."""
+        for job in self.spool.load("running"):
+            # Interrupted runs continue from their journal instead of starting over.
+            if glob.glob(os.path.join(job["output"], "journal_*.jsonl")):
+                job["resume"] = True
+            self.spool.move(job, "running", "queued")
+        for job in self.spool.load("queued"):
+            self._enqueue(job)
+        if not self.queue.empty():
+            self.log(f"Recovered {self.queue.qsize()} job(s) from the spool.")
+
+    async def _run_job(self, job):
+        self._refresh_config()
+        job_id = job["id"]
+        job["started_at"] = datetime.now().isoformat(timespec="seconds")
+        self.spool.move(job, "queued", "running")
+        self.log(f"[{job_id}] started: {job['input']}")
+
+        options = {
+            argument: job[key]
+            for key, argument in JOB_OPTIONS.items()
+            if job.get(key) is not None
+        }
+        with open(self.spool.log_path(job_id), "a", encoding="utf-8") as log_file:
+
+            def _status(message):
+                log_file.write(message + "\n")
+                log_file.flush()
+
+            ok = await run_pipeline_async(
+                job["input"],
+                status_callback=_status,
+                use_cache=not job.get("no_cache", False),
+                resume_dir=job["output"] if job.get("resume") else None,
+                metrics=Metrics(),
+                config=self.config,
+                clients=self.clients,
+                pool=self.pool,
+                limiter=self.limiter,
+                tts_semaphore=self.tts_semaphore,
+                **options,
+            )
+
+        job["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        if ok:
+            job["apkg"] = RunJournal.written_decks(job["output"])
+        self.spool.move(job, "running", "done" if ok else "failed")
+        self.log(
+            f"[{job_id}] {'done' if ok else 'FAILED'} "
+            f"(log: {self.spool.log_path(job_id)})"
+        )
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self.queue.get()
+            try:
+                await self._run_job(job)
+            except Exception as e:
+                job["error"] = str(e)
+                self.spool.move(job, "running", "failed")
+                self.log(f"[{job['id']}] FAILED: {e}")
+
+    async def run(self):
+        self.recover()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.max_jobs)]
+        try:
+            while True:
+                for job in self.spool.accept_incoming():
+                    self.log(f"[{job['id']}] queued (priority {job['priority']})")
+                    self._enqueue(job)
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            for task in workers:
+                task.cancel()
+
+
+def serve(spool_dir=None, port=None, max_jobs=None, log=print, config_path=None):
+    """Runs the daemon until interrupted (Ctrl+C)."""
+    settings = load_settings(config_path)
+    spool = JobSpool(spool_dir or settings.serve.spool_dir)
+    port = port if port is not None else settings.serve.port
+    if port:
+        serve_http(spool, int(port))
+        log(f"Accepting jobs on http://127.0.0.1:{port}/jobs")
+
+    async def _main():
+        # Clients and semaphores belong to the event loop the jobs run on.
+        daemon = JobDaemon(
+            settings,
+            spool,
+            max_jobs=(
+                max_jobs if max_jobs is not None else settings.serve.max_concurrent_jobs
+            ),
+            poll_interval=settings.serve.poll_interval_seconds,
+            log=log,
+            config_path=config_path,
+        )
+        log(
+            f"Watching {os.path.join(spool.spool_dir, 'incoming')} "
+            f"({daemon.max_jobs} job(s) at a time)..."
+        )
+        await daemon.run()
+
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        log("Stopped. Unfinished jobs continue on the next start.")
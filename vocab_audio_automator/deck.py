@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import zipfile
+import tempfile
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import Metrics
+
+################################
+# Anki Deck Assembly           #
+################################
+
+# genanki is imported where it is used, so importing the package (e.g. for
+# `anki-cli --help`) doesn't pay for it.
+
+
+def stable_deck_id(deck_name):
+    # Same name -> same id on every run, inside genanki's recommended id range.
+    digest = hashlib.sha1(deck_name.encode("utf-8")).hexdigest()
+    return (1 << 30) + int(digest[:8], 16) % (1 << 30)
+
+
+# Jobs of anki-cli serve can export to the same deck at the same time; their
+# manifest saves are serialized per file and merged with what is on disk.
+_manifest_locks = {}
+_manifest_locks_guard = threading.Lock()
+
+
+def _manifest_lock(path):
+    with _manifest_locks_guard:
+        return _manifest_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _read_manifest(path):
+    if not os.path.exists(path):
+        return set(), set()
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return set(data.get("notes", [])), set(data.get("media", []))
+
+
+class DeckManifest:
+    """Remembers which notes and media files of a deck were already exported."""
+
+    def __init__(self, path):
+        self.path = path
+        self.notes, self.media = _read_manifest(path)
+
+    def save(self):
+        """Merges this run's entries into the manifest on disk.
+
+        Another run for the same deck may have saved since this one started;
+        its entries are kept instead of being overwritten.
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with _manifest_lock(self.path):
+            notes, media = _read_manifest(self.path)
+            self.notes |= notes
+            self.media |= media
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"notes": sorted(self.notes), "media": sorted(self.media)},
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, self.path)
+
+
+class _SpilledNotes:
+    """Re-iterable view of spilled notes (genanki walks them twice).
+
+    start/stop are byte offsets into the spill file, so a package part only
+    reads its own notes.
+    """
+
+    def __init__(self, spill_file, model, start=0, stop=None):
+        self.spill_file = spill_file
+        self.model = model
+        self.start = start
+        self.stop = stop
+
+    def records(self):
+        self.spill_file.seek(self.start)
+        while self.stop is None or self.spill_file.tell() < self.stop:
+            line = self.spill_file.readline()
+            if not line:
+                return
+            yield json.loads(line)
+
+    def media(self):
+        for _, _, media_path, _ in self.records():
+            if media_path:
+                yield media_path
+
+    def __iter__(self):
+        import genanki
+
+        for fields, guid, _, _ in self.records():
+            yield genanki.Note(model=self.model, fields=fields, guid=guid)
+
+
+def write_apkg(output_apkg, collection_path, media_paths, compresslevel=0):
+    """Writes a collection and its media into an .apkg file.
+
+    The collection database is always deflated (it shrinks ~4x), media
+    entries are stored as-is unless compresslevel is 1-9. Files are streamed
+    into the zip in chunks, and the package is only moved into place once it
+    is complete.
+    """
+    media_names = {}
+    seen = set()
+    tmp_path = f"{output_apkg}.tmp"
+    with zipfile.ZipFile(
+        tmp_path,
+        "w",
+        compression=zipfile.ZIP_DEFLATED if compresslevel else zipfile.ZIP_STORED,
+        compresslevel=compresslevel or None,
+    ) as outzip:
+        outzip.write(
+            collection_path,
+            "collection.anki2",
+            compress_type=zipfile.ZIP_DEFLATED,
+            # Level 1 already gets the database to ~25%, at a third of level 6's time.
+            compresslevel=1,
+        )
+        for path in media_paths:
+            name = os.path.basename(path)
+            # The same clip can back several notes; the package needs it once.
+            if name in seen:
+                continue
+            seen.add(name)
+            idx = str(len(media_names))
+            outzip.write(path, idx)
+            media_names[idx] = name
+        outzip.writestr("media", json.dumps(media_names))
+    os.replace(tmp_path, output_apkg)
+    return output_apkg
+
+
+class DeckBuilder:
+    """Collects notes as clips arrive and writes the final .apkg.
+
+    With a manifest, only notes and media that were never exported before end
+    up in the package (a delta deck). Because the deck id is derived from the
+    deck name, Anki merges the delta into the existing deck on import.
+    Notes are spilled to a temporary JSONL file as they arrive and only turned
+    into genanki notes while the package is written. Decks whose media exceed
+    anki.max_package_mb are split into several self-contained parts.
+    """
+
+    def __init__(
+        self, config, deck_name, status_callback=print, manifest=None, metrics=None
+    ):
+        import genanki
+
+        self.status_callback = status_callback
+        self.manifest = manifest
+        self.metrics = metrics or Metrics()
+        anki_cfg = config["anki"]
+        self.compresslevel = min(9, max(0, int(anki_cfg.get("media_compression", 0))))
+        self.max_part_bytes = int(
+            float(anki_cfg.get("max_package_mb", 0) or 0) * 1024 * 1024
+        )
+        self.workers = max(1, int(anki_cfg.get("packaging_workers", 4)))
+        self.model = genanki.Model(
+            anki_cfg["model_id"],
+            deck_name,
+            fields=[{"name": "Front"}, {"name": "Back"}, {"name": "Audio"}],
+            templates=[
+                {
+                    "name": "Card 1",
+                    "qfmt": "{{Front}}<br><br>{{Audio}}",
+                    "afmt": '{{FrontSide}}<hr id="answer">{{Back}}',
+                }
+            ],
+            css=".card { font-family: arial; font-size: 20px; text-align: center; color: black; background-color: white; }",
+        )
+        self.deck_id = stable_deck_id(deck_name)
+        self.deck_name = deck_name
+        self.spill_file = tempfile.TemporaryFile("w+b")
+        self.added = 0
+        self.skipped = 0
+        self.media_count = 0
+        # Spill file offsets where a new package part starts (anki.max_package_mb)
+        self._part_ends = []
+        self._part_bytes = 0
+
+    def add(self, entry):
+        from genanki import guid_for
+
+        front_text, back_text, audio_path, _ = entry
+        guid = guid_for(front_text)
+        if self.manifest and guid in self.manifest.notes:
+            self.skipped += 1
+            return
+
+        audio_filename = os.path.basename(audio_path)
+        fields = [front_text, back_text, f"[sound:{audio_filename}]"]
+        media_path, size = None, 0
+        if self.manifest and audio_filename in self.manifest.media:
+            pass
+        elif os.path.exists(audio_path):
+            media_path, size = audio_path, os.path.getsize(audio_path)
+            self.media_count += 1
+        else:
+            self.status_callback(f"Warning: Audio file not found: {audio_path}")
+
+        if (
+            self.max_part_bytes
+            and self._part_bytes
+            and self._part_bytes + size > self.max_part_bytes
+        ):
+            self._part_ends.append(self.spill_file.tell())
+            self._part_bytes = 0
+        self._part_bytes += size
+        self.spill_file.write(
+            (
+                json.dumps([fields, guid, media_path, size], ensure_ascii=False) + "\n"
+            ).encode("utf-8")
+        )
+        self.added += 1
+
+    def _part_paths(self, output_apkg, count):
+        if count == 1:
+            return [output_apkg]
+        stem, ext = os.path.splitext(output_apkg)
+        return [f"{stem}_part{n}{ext}" for n in range(1, count + 1)]
+
+    def write(self, output_apkg, update_manifest=True):
+        """Writes the package (or its parts) and returns the list of written files.
+
+        Without update_manifest (partial decks of a stopped run) the notes are
+        not recorded as exported, so the resumed run delivers them again.
+        """
+        import genanki
+
+        self.spill_file.flush()
+        bounds = [0, *self._part_ends, self.spill_file.tell()]
+        parts = [
+            _SpilledNotes(self.spill_file, self.model, start, stop)
+            for start, stop in zip(bounds, bounds[1:])
+        ]
+        paths = self._part_paths(output_apkg, len(parts))
+        timestamp = time.time()
+        # One id sequence for all parts, so their note and card ids never clash.
+        id_gen = itertools.count(int(timestamp * 1000))
+
+        started = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="vocab_apkg_") as tmp_dir:
+            jobs = []
+            for n, notes in enumerate(parts):
+                collection_path = os.path.join(tmp_dir, f"collection{n}.anki2")
+                with self.metrics.span("deck_collection"):
+                    deck = genanki.Deck(self.deck_id, self.deck_name)
+                    deck.notes = notes
+                    conn = sqlite3.connect(collection_path)
+                    genanki.Package(deck).write_to_db(conn.cursor(), timestamp, id_gen)
+                    conn.commit()
+                    conn.close()
+                # A single package streams its media list from the spill file;
+                # parts are zipped in parallel, so each gets its own list.
+                media = notes.media() if len(parts) == 1 else list(notes.media())
+                jobs.append((paths[n], collection_path, media))
+
+            with self.metrics.span("deck_zip"):
+                if len(jobs) == 1:
+                    write_apkg(*jobs[0], compresslevel=self.compresslevel)
+                else:
+                    with ThreadPoolExecutor(
+                        max_workers=min(self.workers, len(jobs))
+                    ) as pool:
+                        futures = [
+                            pool.submit(write_apkg, *job, self.compresslevel)
+                            for job in jobs
+                        ]
+                        for future in futures:
+                            future.result()
+
+        size_mb = sum(os.path.getsize(p) for p in paths) / (1024 * 1024)
+        self.metrics.inc("deck_parts", len(paths))
+        self.status_callback(
+            f"Packaged {self.added} note(s) and {self.media_count} media file(s) "
+            f"into {len(paths)} file(s), {size_mb:.1f} MB in "
+            f"{time.perf_counter() - started:.1f}s."
+        )
+
+        if self.manifest:
+            self.status_callback(
+                f"Incremental deck: {self.added} new note(s), "
+                f"{self.skipped} already exported, {self.media_count} new media file(s)."
+            )
+        if self.manifest and update_manifest:
+            for fields, guid, media_path, _ in _SpilledNotes(
+                self.spill_file, self.model
+            ).records():
+                self.manifest.notes.add(guid)
+                if media_path:
+                    self.manifest.media.add(os.path.basename(media_path))
+            self.manifest.save()
+        self.spill_file.close()
+        return paths
+
+
+def open_deck_manifest(cache_dir, deck_name):
+    return DeckManifest(
+        os.path.join(cache_dir, "decks", f"{stable_deck_id(deck_name)}.json")
+    )
@@ -0,0 +1,241 @@
+import os
+import re
+import time
+import struct
+import random
+import sqlite3
+import hashlib
+
+from .cache import normalize_text, resolve_cache_dir
+
+################################
+# Sentence Deduplication       #
+################################
+
+# Sentences are compared in a normalized form (case, punctuation and spacing
+# ignored). Near-duplicates ("Ho comprato il pane." / "Ho comprato del pane.")
+# are found with MinHash signatures over character shingles, bucketed with
+# locality-sensitive hashing so a lookup only compares a handful of candidates.
+
+SHINGLE_SIZE = 4
+NUM_PERMUTATIONS = 64
+BANDS = 16  # 16 bands x 4 rows: sentences above ~50% similarity become candidates
+_ROWS = NUM_PERMUTATIONS // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+# Fixed seed: signatures stored by earlier runs must stay comparable.
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def normalize_sentence(text):
+    text = normalize_text(text).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def minhash_signature(norm):
+    padded = f" {norm} "
+    shingles = {
+        padded[i : i + SHINGLE_SIZE]
+        for i in range(max(1, len(padded) - SHINGLE_SIZE + 1))
+    }
+    hashes = [
+        int.from_bytes(
+            hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        for s in shingles
+    ]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def signature_similarity(first, second):
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return sum(x == y for x, y in zip(first, second)) / NUM_PERMUTATIONS
+
+
+def _pack(signature):
+    return struct.pack(f"<{NUM_PERMUTATIONS}Q", *signature)
+
+
+def _band_keys(signature):
+    packed = _pack(signature)
+    step = _ROWS * 8
+    keys = []
+    for band in range(BANDS):
+        rows = packed[band * step : (band + 1) * step]
+        keys.append(f"{band}:{hashlib.blake2b(rows, digest_size=8).hexdigest()}")
+    return keys
+
+
+class SentenceIndex:
+    """Remembers which sentences a run (and, per deck, earlier runs) already has.
+
+    check() is called for every sentence before it is synthesized; it returns
+    None for new sentences or "duplicate" / "near_duplicate". A sentence is
+    only remembered by add(), once its note is written, so a sentence whose
+    synthesis failed doesn't block its later copies (discard() forgets it).
+    add() rejects a copy when another one reached the deck first (copies can
+    be synthesized at the same time); those are counted in rejected, since
+    their synthesis was not avoided.
+    commit() persists the run's sentences once the complete deck is written.
+    With scope "deck", sentences an earlier run exported to the same deck
+    count as duplicates too.
+    The sentences of the current run live in temporary SQLite tables, so
+    memory stays flat for huge runs.
+    """
+
+    def __init__(
+        self,
+        db_path,
+        deck_name,
+        scope="run",
+        near_duplicates=False,
+        similarity=0.8,
+    ):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.deck_name = deck_name
+        self.use_history = scope == "deck"
+        self.near_duplicates = near_duplicates
+        self.similarity = similarity
+        # Dropped before synthesis (by check) and after it (by add).
+        self.skipped = {"duplicate": 0, "near_duplicate": 0}
+        self.rejected = {"duplicate": 0, "near_duplicate": 0}
+        # Signatures computed by check(), reused when the sentence is added.
+        self._signatures = {}
+        # Autocommit: temp-table writes don't need transactions, commit() opens its own.
+        self._conn = sqlite3.connect(db_path, isolation_level=None)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sentences ("
+            "deck TEXT NOT NULL, norm TEXT NOT NULL, text TEXT NOT NULL, "
+            "signature BLOB, created_at REAL NOT NULL, PRIMARY KEY (deck, norm));"
+            "CREATE TABLE IF NOT EXISTS bands ("
+            "deck TEXT NOT NULL, band TEXT NOT NULL, norm TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS bands_lookup ON bands (deck, band);"
+            "CREATE TEMP TABLE run_sentences ("
+            "norm TEXT PRIMARY KEY, text TEXT NOT NULL, signature BLOB);"
+            "CREATE TEMP TABLE run_bands (band TEXT NOT NULL, norm TEXT NOT NULL);"
+            "CREATE INDEX temp.run_bands_lookup ON run_bands (band);"
+        )
+
+    def _known(self, norm):
+        row = self._conn.execute(
+            "SELECT 1 FROM run_sentences WHERE norm = ?", (norm,)
+        ).fetchone()
+        if row or not self.use_history:
+            return row is not None
+        row = self._conn.execute(
+            "SELECT 1 FROM sentences WHERE deck = ? AND norm = ?",
+            (self.deck_name, norm),
+        ).fetchone()
+        return row is not None
+
+    def _similar(self, signature, bands):
+        placeholders = ",".join("?" * len(bands))
+        rows = self._conn.execute(
+            "SELECT DISTINCT r.signature FROM run_bands b JOIN run_sentences r "
+            f"ON r.norm = b.norm WHERE b.band IN ({placeholders})",
+            bands,
+        ).fetchall()
+        if self.use_history:
+            rows += self._conn.execute(
+                "SELECT DISTINCT s.signature FROM bands b JOIN sentences s "
+                "ON s.deck = b.deck AND s.norm = b.norm "
+                f"WHERE b.deck = ? AND b.band IN ({placeholders})",
+                (self.deck_name, *bands),
+            ).fetchall()
+        for (blob,) in rows:
+            if blob is None:
+                continue
+            stored = struct.unpack(f"<{NUM_PERMUTATIONS}Q", blob)
+            if signature_similarity(signature, stored) >= self.similarity:
+                return True
+        return False
+
+    def _verdict(self, norm, signature):
+        if self._known(norm):
+            return "duplicate"
+        if signature and self._similar(signature, _band_keys(signature)):
+            return "near_duplicate"
+        return None
+
+    def _signature(self, norm):
+        # Signatures are only computed when near-duplicate search is on.
+        if not self.near_duplicates:
+            return None
+        signature = self._signatures.pop(norm, None)
+        return signature or minhash_signature(norm)
+
+    def check(self, text):
+        """Verdict for a sentence about to be synthesized; nothing is remembered yet."""
+        norm = normalize_sentence(text)
+        signature = self._signature(norm)
+        verdict = self._verdict(norm, signature)
+        if verdict:
+            self.skipped[verdict] += 1
+        elif signature:
+            self._signatures[norm] = signature
+        return verdict
+
+    def add(self, text):
+        """Remembers a sentence whose note goes into the deck.
+
+        Returns the verdict instead if a copy got there first; that note is
+        left out.
+        """
+        norm = normalize_sentence(text)
+        signature = self._signature(norm)
+        verdict = self._verdict(norm, signature)
+        if verdict:
+            self.rejected[verdict] += 1
+            return verdict
+        if signature:
+            self._conn.executemany(
+                "INSERT INTO run_bands (band, norm) VALUES (?, ?)",
+                [(band, norm) for band in _band_keys(signature)],
+            )
+        self._conn.execute(
+            "INSERT INTO run_sentences (norm, text, signature) VALUES (?, ?, ?)",
+            (norm, text, _pack(signature) if signature else None),
+        )
+        return None
+
+    def discard(self, text):
+        """Forgets a sentence that passed check() but will not be added."""
+        self._signatures.pop(normalize_sentence(text), None)
+
+    def commit(self):
+        """Persists the sentences of the written deck (not for partial decks)."""
+        self._conn.execute("BEGIN")
+        self._conn.execute(
+            "INSERT INTO bands (deck, band, norm) "
+            "SELECT ?, b.band, b.norm FROM run_bands b JOIN run_sentences r "
+            "ON r.norm = b.norm WHERE NOT EXISTS ("
+            "SELECT 1 FROM sentences s WHERE s.deck = ? AND s.norm = r.norm)",
+            (self.deck_name, self.deck_name),
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO sentences (deck, norm, text, signature, created_at) "
+            "SELECT ?, norm, text, signature, ? FROM run_sentences",
+            (self.deck_name, time.time()),
+        )
+        self._conn.execute("COMMIT")
+
+    def close(self):
+        self._conn.close()
+
+
+def open_sentence_index(config, base_dir, deck_name):
+    """Builds the SentenceIndex described by the config, or None if it is disabled."""
+    dedup_cfg = config.get("dedup") or {}
+    if not dedup_cfg.get("enabled", True):
+        return None
+    return SentenceIndex(
+        os.path.join(resolve_cache_dir(config, base_dir), "sentences.sqlite3"),
+        deck_name,
+        scope=dedup_cfg.get("scope", "run"),
+        near_duplicates=bool(dedup_cfg.get("near_duplicates", False)),
+        similarity=float(dedup_cfg.get("similarity", 0.8)),
+    )
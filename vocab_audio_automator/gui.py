@@ -1,16 +1,29 @@
 import os
 import sys
+import time
 import yaml
+import queue
 import threading
+from collections import deque
+
 import customtkinter as ctk
 from tkinter import filedialog
 from dotenv import load_dotenv, set_key
 
+from .control import RunControl
 from .core import run_pipeline
+from .metrics import Metrics, format_duration
+from .settings import parse_settings
 
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
 
+# The worker thread never touches widgets: it puts events on a queue that the
+# Tk main loop drains every UI_TICK_MS, keeping only the latest status and
+# progress per tick. The run log keeps the last LOG_LINES lines.
+UI_TICK_MS = 100
+LOG_LINES = 500
+
 
 class AnkiGeneratorApp(ctk.CTk):
     def __init__(self):
@@ -42,6 +55,12 @@ class AnkiGeneratorApp(ctk.CTk):
         self.setup_advanced_tab()
         self.load_current_settings()
 
+        self.events = queue.SimpleQueue()
+        self.run_started = None
+        self.run_metrics = None
+        self.run_control = None
+        self.after(UI_TICK_MS, self.drain_events)
+
     ####################
     # TAB 1: GENERATOR #
     ####################
@@ -112,13 +131,43 @@ class AnkiGeneratorApp(ctk.CTk):
             command=self.start_generation,
             height=40,
         )
-        self.btn_generate.pack(pady=(15, 10))
+        self.btn_generate.pack(pady=(15, 5))
+
+        self.btn_resume = ctk.CTkButton(
+            self.tab_gen,
+            text="Resume Interrupted Run...",
+            command=self.resume_generation,
+            fg_color="gray",
+        )
+        self.btn_resume.pack(pady=(0, 10))
+
+        # Only shown while a run is active (see start_worker)
+        self.run_buttons = ctk.CTkFrame(self.tab_gen, fg_color="transparent")
+        self.btn_pause = ctk.CTkButton(
+            self.run_buttons, text="Pause", command=self.toggle_pause, width=120
+        )
+        self.btn_pause.pack(side="left", padx=5)
+        self.btn_stop = ctk.CTkButton(
+            self.run_buttons,
+            text="Stop",
+            command=self.stop_generation,
+            width=120,
+            fg_color="#b22222",
+        )
+        self.btn_stop.pack(side="left", padx=5)
 
         self.progress_bar = ctk.CTkProgressBar(self.tab_gen, width=400)
         self.progress_bar.set(0)
 
         self.status_label = ctk.CTkLabel(self.tab_gen, text="")
-        self.status_label.pack(pady=10)
+        self.status_label.pack(pady=(10, 0))
+
+        self.stats_label = ctk.CTkLabel(self.tab_gen, text="", text_color="gray")
+        self.stats_label.pack(pady=(0, 5))
+
+        self.log_box = ctk.CTkTextbox(self.tab_gen, width=560, height=160)
+        self.log_box.configure(state="disabled")
+        self.log_box.pack(pady=(0, 10), fill="both", expand=True)
 
     ###############################################
     # TAB 2 & 3: SETTINGS (Condensed for brevity) #
@@ -398,22 +447,123 @@ class AnkiGeneratorApp(ctk.CTk):
             self.update_status("Please enter a valid Output Filename!", "red")
             return
 
+        self.start_worker()
+
+    def resume_generation(self):
+        dirname = filedialog.askdirectory(
+            title="Select the Output Folder of the Interrupted Run"
+        )
+        if not dirname:
+            return
+        self.start_worker(resume_dir=dirname)
+
+    def start_worker(self, resume_dir=None):
         self.btn_generate.configure(state="disabled")
+        self.btn_resume.configure(state="disabled")
         self.switch_audio_only.configure(state="disabled")
-        self.progress_bar.pack(pady=5)
+        self.progress_bar.pack(pady=5, before=self.status_label)
+        self.btn_pause.configure(text="Pause", state="normal")
+        self.btn_stop.configure(state="normal")
+        self.run_buttons.pack(pady=5, before=self.status_label)
         self.progress_bar.set(0)
-        self.update_status("Starting...", "yellow")
-        threading.Thread(target=self.run_worker, daemon=True).start()
+        self.log_box.configure(state="normal")
+        self.log_box.delete("1.0", "end")
+        self.log_box.configure(state="disabled")
+        self.run_started = time.monotonic()
+        self.run_metrics = Metrics()
+        self.run_control = RunControl()
+        self.update_status("Resuming..." if resume_dir else "Starting...", "yellow")
+        threading.Thread(
+            target=self.run_worker, args=(resume_dir,), daemon=True
+        ).start()
+
+    def toggle_pause(self):
+        if self.run_control.paused:
+            self.run_control.resume()
+            self.btn_pause.configure(text="Pause")
+            self.update_status("Continuing...", "yellow")
+        else:
+            self.run_control.pause()
+            self.btn_pause.configure(text="Continue")
+            self.update_status(
+                "Paused. Requests already running will still finish.", "yellow"
+            )
 
-    def update_status(self, message, color="white"):
-        self.after(
-            0, lambda: self.status_label.configure(text=message, text_color=color)
+    def stop_generation(self):
+        self.run_control.stop()
+        self.btn_pause.configure(state="disabled")
+        self.btn_stop.configure(state="disabled")
+        self.update_status(
+            "Stopping: finishing requests in flight, then writing a partial deck...",
+            "yellow",
         )
 
-    def update_progress(self, value):
-        self.after(0, lambda: self.progress_bar.set(value))
+    def update_status(self, message, color="white"):
+        # Safe from any thread; shown on the next UI tick.
+        self.events.put(("status", message, color))
 
-    def run_worker(self):
+    def update_progress(self, value):
+        self.events.put(("progress", value))
+
+    def drain_events(self):
+        """Applies everything the worker reported since the last tick."""
+        status = progress = None
+        finished = False
+        new_lines = deque(maxlen=LOG_LINES)
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "status":
+                status = event[1:]
+                new_lines.append(event[1])
+            elif event[0] == "progress":
+                progress = event[1]
+            elif event[0] == "finished":
+                finished = True
+
+        if status:
+            self.status_label.configure(text=status[0], text_color=status[1])
+        if progress is not None:
+            self.progress_bar.set(progress)
+        if new_lines:
+            self.append_log(new_lines)
+        if self.run_started is not None:
+            self.update_stats(progress)
+        if finished:
+            self.run_started = None
+            self.run_buttons.pack_forget()
+            self.btn_generate.configure(state="normal")
+            self.btn_resume.configure(state="normal")
+            self.switch_audio_only.configure(state="normal")
+        self.after(UI_TICK_MS, self.drain_events)
+
+    def append_log(self, lines):
+        self.log_box.configure(state="normal")
+        self.log_box.insert("end", "\n".join(lines) + "\n")
+        # Ring buffer: drop the oldest lines beyond LOG_LINES.
+        line_count = int(self.log_box.index("end-1c").split(".")[0]) - 1
+        if line_count > LOG_LINES:
+            self.log_box.delete("1.0", f"{line_count - LOG_LINES + 1}.0")
+        self.log_box.configure(state="disabled")
+        self.log_box.see("end")
+
+    def update_stats(self, progress):
+        elapsed = time.monotonic() - self.run_started
+        if progress is None:
+            progress = self.progress_bar.get()
+        parts = [f"{progress * 100:.0f}%", f"{format_duration(elapsed)} elapsed"]
+        if 0.01 <= progress < 1:
+            parts.append(f"ETA {format_duration(elapsed * (1 - progress) / progress)}")
+        clips = self.run_metrics.count("tts_request")
+        if clips and elapsed > 0:
+            parts.append(f"{clips / elapsed * 60:.0f} clips/min")
+        if self.run_control.paused:
+            parts.append("paused")
+        self.stats_label.configure(text="  ·  ".join(parts))
+
+    def run_worker(self, resume_dir=None):
         custom_name = self.entry_filename.get().strip()
         target_deck = self.entry_deck_name.get().strip()
         audio_only_mode = self.switch_audio_only.get()
@@ -426,15 +576,21 @@ class AnkiGeneratorApp(ctk.CTk):
             run_audio_only=audio_only_mode,
             status_callback=self.update_status,
             progress_callback=self.update_progress,
+            resume_dir=resume_dir,
+            metrics=self.run_metrics,
+            control=self.run_control,
         )
         if success:
             self.update_status(
-                f"Successfully finished! {custom_name}.apkg created.", "green"
+                (
+                    "Successfully finished! Resumed run completed."
+                    if resume_dir
+                    else f"Successfully finished! {custom_name}.apkg created."
+                ),
+                "green",
             )
             self.update_progress(1.0)
-
-        self.after(0, lambda: self.btn_generate.configure(state="normal"))
-        self.after(0, lambda: self.switch_audio_only.configure(state="normal"))
+        self.events.put(("finished",))
 
     #################################
     # LOGIC: SETTINGS (Load & Save) #
@@ -558,6 +714,8 @@ class AnkiGeneratorApp(ctk.CTk):
                 v.strip() for v in self.entry_edge_voices.get().split(",") if v.strip()
             ]
 
+            # Invalid settings are rejected here instead of failing the next run.
+            parse_settings(config, source="these settings")
             with open("config.yaml", "w", encoding="utf-8") as f:
                 yaml.dump(
                     config,
@@ -611,6 +769,8 @@ class AnkiGeneratorApp(ctk.CTk):
                 "1.0", "end-1c"
             )
 
+            # Invalid settings are rejected here instead of failing the next run.
+            parse_settings(config, source="these settings")
             with open("config.yaml", "w", encoding="utf-8") as f:
                 yaml.dump(
                     config,
@@ -0,0 +1,165 @@
+import os
+import json
+import glob
+from datetime import datetime
+
+################################
+# Run Journal                  #
+################################
+
+
+def run_stamp():
+    """Timestamp for the files of one run; unique even for runs in the same second."""
+    return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+
+
+def _done_record(path):
+    """The "done" record of a journal, None while its run is unfinished."""
+    done = None
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            # Cheap substring test first; completions can be long.
+            if '"done"' not in line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("type") == "done":
+                done = entry
+    return done
+
+
+class RunJournal:
+    """Append-only JSONL log of a run, used to resume it after an interruption.
+
+    The first line describes the run (input file, output names, mode), every
+    following line records one finished unit of work:
+      {"type": "completion", "word": ..., "job": <row index>, "text": ...}
+      {"type": "clip", "target": ..., "source": ..., "path": ..., "voice": ...}
+        (path relative to the run folder)
+      {"type": "batch", "provider": ..., "id": ..., "custom_ids": [...]}
+      {"type": "batch_done", "id": ...}
+      {"type": "done", "apkg": [...]}  (one path per package part)
+    """
+
+    def __init__(self, path, records=None):
+        self.path = path
+        self.run_dir = os.path.dirname(os.path.abspath(path))
+        self.records = records or []
+        self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def start(cls, run_dir, **params):
+        os.makedirs(run_dir, exist_ok=True)
+        journal = cls(os.path.join(run_dir, f"journal_{run_stamp()}.jsonl"))
+        journal.record("run", **params)
+        return journal
+
+    @classmethod
+    def resume(cls, path):
+        """Opens a journal file, or the latest unfinished journal in a run folder.
+
+        Several runs can share an output folder; a finished later run doesn't
+        hide an interrupted earlier one. If every run in the folder finished,
+        the most recent one is opened.
+        """
+        if os.path.isdir(path):
+            candidates = sorted(glob.glob(os.path.join(path, "journal_*.jsonl")))
+            if not candidates:
+                raise Exception(f"No run journal found in '{path}'.")
+            unfinished = [c for c in candidates if _done_record(c) is None]
+            path = (unfinished or candidates)[-1]
+        elif not os.path.isfile(path):
+            raise Exception(f"No run journal found at '{path}'.")
+
+        records = []
+        complete = 0
+        with open(path, "rb+") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A crash left a half-written last line behind.
+                    break
+                complete += len(line)
+                try:
+                    records.append(json.loads(line))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # Unreadable, but later lines may still be fine.
+                    continue
+            # Cut the broken line off, so the first new record starts a line
+            # of its own instead of being glued onto it.
+            f.truncate(complete)
+        if not records or records[0].get("type") != "run":
+            raise Exception(f"Run journal '{path}' is missing its header.")
+        return cls(path, records)
+
+    @staticmethod
+    def written_decks(run_dir):
+        """The .apkg paths of the latest finished run in run_dir (None if unfinished)."""
+        candidates = sorted(glob.glob(os.path.join(run_dir, "journal_*.jsonl")))
+        if not candidates:
+            return None
+        done = _done_record(candidates[-1])
+        return done["apkg"] if done else None
+
+    def record(self, record_type, **fields):
+        entry = {"type": record_type, **fields}
+        # self.records is what a resume read from disk (plus the header); new
+        # entries are only written, so a long run doesn't keep them in memory.
+        if not self.records:
+            self.records.append(entry)
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def record_clip(self, target, source, path, voice):
+        # Relative to the run folder, so a resume finds the clip from any
+        # working directory (GUI, daemon, --resume with an absolute path).
+        self.record(
+            "clip",
+            target=target,
+            source=source,
+            path=os.path.relpath(path, self.run_dir),
+            voice=voice,
+        )
+
+    def _clip_path(self, path):
+        resolved = os.path.join(self.run_dir, path)
+        if os.path.exists(resolved):
+            return resolved
+        # Journals written before paths were relative to the run folder hold
+        # paths relative to the working directory of that run.
+        return os.path.abspath(path) if os.path.exists(path) else None
+
+    @property
+    def params(self):
+        return {k: v for k, v in self.records[0].items() if k != "type"}
+
+    def completed_jobs(self):
+        """Maps row index -> response (by word for journals written before rows were jobs)."""
+        return {
+            r.get("job", r["word"]): r["text"]
+            for r in self.records
+            if r["type"] == "completion"
+        }
+
+    def completed_clips(self):
+        """Maps target sentence -> look-up entry for clips that still exist on disk."""
+        clips = {}
+        for r in self.records:
+            if r["type"] != "clip":
+                continue
+            path = self._clip_path(r["path"])
+            if path:
+                clips[r["target"]] = (r["target"], r["source"], path, r["voice"])
+        return clips
+
+    def open_batch(self, provider):
+        """Returns the last submitted batch whose results were never collected."""
+        collected = {r["id"] for r in self.records if r["type"] == "batch_done"}
+        for r in reversed(self.records):
+            if r["type"] == "batch" and r["provider"] == provider:
+                return None if r["id"] in collected else r
+        return None
+
+    def close(self):
+        self._file.close()
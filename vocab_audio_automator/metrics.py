@@ -0,0 +1,151 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+################################
+# Run Metrics                  #
+################################
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s"
+
+
+class Metrics:
+    """Collects stage timings, latency histograms and counters of a run.
+
+    Stages are timed with span(); every span lands in a per-stage histogram.
+    Counters cover retries, tokens, cache hits and bytes written. The data can
+    be dumped as JSON or rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.setdefault(
+                stage,
+                {
+                    "count": 0,
+                    "sum": 0.0,
+                    "min": None,
+                    "max": 0.0,
+                    "buckets": [0] * len(LATENCY_BUCKETS),
+                },
+            )
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            histogram["max"] = max(histogram["max"], seconds)
+            if histogram["min"] is None or seconds < histogram["min"]:
+                histogram["min"] = seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+                    break
+
+    def count(self, stage):
+        """How often a stage has been observed so far (cheap enough for UI ticks)."""
+        with self._lock:
+            return self.histograms.get(stage, {}).get("count", 0)
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            stages = {}
+            for stage, h in self.histograms.items():
+                stages[stage] = {
+                    "count": h["count"],
+                    "total_seconds": round(h["sum"], 4),
+                    "mean_seconds": round(h["sum"] / h["count"], 4),
+                    "min_seconds": round(h["min"], 4),
+                    "max_seconds": round(h["max"], 4),
+                    "buckets": {
+                        str(bound): count
+                        for bound, count in zip(LATENCY_BUCKETS, h["buckets"])
+                    },
+                }
+            return {
+                "started_at": self.started_at,
+                "elapsed_seconds": round(time.time() - self.started_at, 3),
+                "stages": stages,
+                "counters": dict(self.counters),
+            }
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        return path
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP vocab_stage_duration_seconds Time spent per pipeline stage.",
+            "# TYPE vocab_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, h["buckets"]):
+                    cumulative += count
+                    lines.append(
+                        f'vocab_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'vocab_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {h["count"]}'
+                )
+                lines.append(
+                    f'vocab_stage_duration_seconds_sum{{stage="{stage}"}} {h["sum"]}'
+                )
+                lines.append(
+                    f'vocab_stage_duration_seconds_count{{stage="{stage}"}} {h["count"]}'
+                )
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE vocab_{name}_total counter")
+                lines.append(f"vocab_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+def serve_prometheus(metrics, port, host="127.0.0.1"):
+    """Exposes metrics.to_prometheus() on http://host:port/metrics in a background thread."""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
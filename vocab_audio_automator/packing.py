@@ -0,0 +1,64 @@
+import json
+
+################################
+# Multi-Word Prompt Packing    #
+################################
+
+
+def build_packed_prompt(entries, config):
+    """Builds one prompt for several words.
+
+    entries maps a short task id to (word, fields), with fields as returned by
+    PromptCompiler.fields. The shared rules are only sent once per request.
+    The template is prompts.packed_generation, which the settings require
+    whenever generation.pack_size is above 1.
+    """
+    template = config["prompts"]["packed_generation"]
+    lines = []
+    for task_id, (word, fields) in entries.items():
+        extra = " ".join(fields["optional_instruction"].split()) or "-"
+        lines.append(
+            f'{task_id} | "{word}" | {fields["target_count"]} | {fields["setting"]} | {extra}'
+        )
+
+    return template.format(
+        entries="\n".join(lines),
+        target_language=config["defaults"]["target_language"],
+        source_language=config["defaults"]["source_language"],
+        language_level=config["defaults"]["level"],
+    )
+
+
+def _extract_json_object(text):
+    # Models like to wrap JSON in ```json fences or add a sentence around it.
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start : end + 1])
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def parse_packed_response(text, entries):
+    """Splits a packed response back into {task_id: "target | source" lines}.
+
+    Only entries that pass validation (right number of well-formed pairs) are
+    returned; the caller retries the missing ones on their own.
+    """
+    data = _extract_json_object(text or "")
+    if data is None:
+        return {}
+
+    results = {}
+    for task_id, (_, fields) in entries.items():
+        sentences = data.get(task_id)
+        if not isinstance(sentences, list):
+            continue
+        lines = [s.strip() for s in sentences if isinstance(s, str) and "|" in s]
+        if len(lines) != len(sentences) or len(lines) != fields["target_count"]:
+            continue
+        results[task_id] = "\n".join(lines)
+    return results
@@ -0,0 +1,291 @@
+import os
+import re
+import time
+import random
+import inspect
+from datetime import datetime
+
+from .resilience import PERMANENT, classify_error, get_breaker, retry_after_seconds
+
+################################
+# Client Pool                  #
+################################
+
+# Sentence requests can be spread over several API keys and models, also
+# across providers. Every response's rate-limit headers tell how much of the
+# key's budget is left; the next request goes to a member picked at random,
+# weighted by its configured weight times that remaining headroom. A member
+# that fails (or is paused by its circuit breaker) is skipped and the request
+# fails over to the next one.
+
+DEFAULT_KEY_ENV = {"openai": "OPENAI_API_KEY", "claude": "ANTHROPIC_API_KEY"}
+
+# Header names of the remaining / total budget and its reset time.
+_HEADROOM_HEADERS = {
+    "openai": [
+        (
+            "x-ratelimit-remaining-requests",
+            "x-ratelimit-limit-requests",
+            "x-ratelimit-reset-requests",
+        ),
+        (
+            "x-ratelimit-remaining-tokens",
+            "x-ratelimit-limit-tokens",
+            "x-ratelimit-reset-tokens",
+        ),
+    ],
+    "claude": [
+        (
+            "anthropic-ratelimit-requests-remaining",
+            "anthropic-ratelimit-requests-limit",
+            "anthropic-ratelimit-requests-reset",
+        ),
+        (
+            "anthropic-ratelimit-tokens-remaining",
+            "anthropic-ratelimit-tokens-limit",
+            "anthropic-ratelimit-tokens-reset",
+        ),
+    ],
+}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+# Members without headroom keep a small share so they are probed again.
+_MIN_HEADROOM = 0.05
+
+
+def _reset_seconds(value):
+    """Parses '1s' / '6m0s' / '20ms' (OpenAI) or an RFC 3339 time (Anthropic)."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value.strip():
+        return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+    try:
+        return max(
+            0.0,
+            datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+            - time.time(),
+        )
+    except ValueError:
+        return None
+
+
+def _as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class PoolMember:
+    """One API key + model that can answer sentence requests."""
+
+    def __init__(self, provider, model_id, client, weight=1.0, name=None, config=None):
+        self.provider = provider
+        self.model_id = model_id
+        self.client = client
+        self.weight = weight
+        self.name = name or f"{provider}/{model_id}"
+        self.breaker = get_breaker(self.name, config or {})
+        self.in_flight = 0
+        self.requests = 0
+        # (remaining / limit, monotonic time the budget resets) per header pair
+        self._budgets = {}
+
+    def headroom(self):
+        """Share of the rate-limit budget left, 1.0 while no headers were seen."""
+        now = time.monotonic()
+        shares = [
+            share
+            for share, reset_at in self._budgets.values()
+            if reset_at is None or reset_at > now
+        ]
+        return max(_MIN_HEADROOM, min(shares, default=1.0))
+
+    def update_headroom(self, headers):
+        if not headers:
+            return
+        for remaining_key, limit_key, reset_key in _HEADROOM_HEADERS[self.provider]:
+            remaining = _as_number(headers.get(remaining_key))
+            limit = _as_number(headers.get(limit_key))
+            if remaining is None or not limit:
+                continue
+            reset = _reset_seconds(headers.get(reset_key))
+            self._budgets[remaining_key] = (
+                remaining / limit,
+                time.monotonic() + reset if reset is not None else None,
+            )
+
+    def available(self):
+        return self.breaker.available()
+
+    def score(self):
+        # Requests already on their way haven't shown up in the headers yet.
+        return self.weight * self.headroom() / (1 + self.in_flight)
+
+    async def complete(self, system_prompt, user_prompt, max_tokens):
+        """Sends one request; returns (text, (input_tokens, output_tokens) or None)."""
+        if self.provider == "openai":
+            raw = await self.client.chat.completions.with_raw_response.create(
+                model=self.model_id,
+                max_completion_tokens=max_tokens,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+            )
+        else:
+            raw = await self.client.messages.with_raw_response.create(
+                model=self.model_id,
+                max_tokens=max_tokens,
+                system=system_prompt,
+                messages=[{"role": "user", "content": user_prompt}],
+            )
+        self.update_headroom(raw.headers)
+        # openai's raw responses parse synchronously, anthropic's are awaited.
+        response = raw.parse()
+        if inspect.isawaitable(response):
+            response = await response
+
+        usage = getattr(response, "usage", None)
+        if self.provider == "openai":
+            text = response.choices[0].message.content
+            tokens = (usage.prompt_tokens, usage.completion_tokens) if usage else None
+        else:
+            text = response.content[0].text
+            tokens = (usage.input_tokens, usage.output_tokens) if usage else None
+        return text, tokens
+
+
+class ClientPool:
+    """Spreads sentence requests over its members and fails over between them."""
+
+    def __init__(self, members, rng=None):
+        if not members:
+            raise Exception("The client pool needs at least one member.")
+        self.members = members
+        self.failovers = 0
+        self._rng = rng or random.Random()
+
+    def pick(self, exclude=()):
+        candidates = [m for m in self.members if m not in exclude]
+        if not candidates:
+            return None
+        ready = [m for m in candidates if m.available()] or candidates
+        return self._rng.choices(ready, weights=[m.score() for m in ready])[0]
+
+    async def call(self, operation, on_failover=None):
+        """Awaits operation(member) on the best member, failing over to the others.
+
+        Each member is tried at most once per call; a permanent error (the
+        request itself is bad) is raised right away. When every member failed,
+        the last error is raised so the caller's retry policy can back off.
+        """
+        tried = []
+        member = self.pick()
+        while True:
+            await member.breaker.acquire()
+            member.in_flight += 1
+            try:
+                try:
+                    result = await operation(member)
+                finally:
+                    member.in_flight -= 1
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == PERMANENT:
+                    member.breaker.record_success()
+                    raise
+                member.breaker.record_failure(retry_after_seconds(e))
+                tried.append(member)
+                fallback = self.pick(exclude=tried)
+                if fallback is None:
+                    raise
+                self.failovers += 1
+                if on_failover:
+                    on_failover(member, fallback, e)
+                member = fallback
+                continue
+            except BaseException:
+                member.breaker.release()
+                raise
+
+            member.breaker.record_success()
+            member.requests += 1
+            return result
+
+
+def make_client(provider, api_key, base_url=None):
+    """Creates the async SDK client of a provider ('openai' or 'claude').
+
+    The SDKs are imported here, not at module load: together they take
+    seconds to import, and runs only need the providers they use.
+    """
+    # Retries are ours (resilience.call_with_retry), not the SDK's.
+    if provider == "openai":
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+    from anthropic import AsyncAnthropic
+
+    return AsyncAnthropic(api_key=api_key, base_url=base_url, max_retries=0)
+
+
+def _default_model_id(config, provider):
+    if provider == "openai":
+        return config["openai"]["sentence_generation"]["model_id"]
+    return config["claude"]["model_id"]
+
+
+def build_client_pool(config, clients, active_ai, env_path=".env"):
+    """Builds the pool from config['pool']['members'].
+
+    Without members the pool is just the configured sentence_generation
+    provider, reusing its client from initialize_clients.
+    """
+    members_cfg = (config.get("pool") or {}).get("members") or []
+    if not members_cfg:
+        # Named after the provider, so it keeps using the provider's breaker.
+        member = PoolMember(
+            active_ai,
+            _default_model_id(config, active_ai),
+            clients[active_ai],
+            name=active_ai,
+            config=config,
+        )
+        return ClientPool([member])
+
+    members = []
+    shared = {}
+    for entry in members_cfg:
+        provider = str(entry.get("provider", "")).lower()
+        if provider not in DEFAULT_KEY_ENV:
+            raise Exception(f"Invalid pool member provider in config: {provider}.")
+        key_env = entry.get("api_key_env") or DEFAULT_KEY_ENV[provider]
+        api_key = os.getenv(key_env)
+        if not api_key:
+            raise Exception(f"Missing {key_env} in {env_path} for the client pool.")
+        base_url = (
+            entry.get("base_url")
+            or (config.get(provider) or {}).get("base_url")
+            or None
+        )
+        model_id = entry.get("model_id") or _default_model_id(config, provider)
+        # One client (and connection pool) per key, even if it serves several models.
+        client_key = (provider, key_env, base_url)
+        if client_key not in shared:
+            shared[client_key] = make_client(provider, api_key, base_url)
+        name = f"{provider}/{model_id}"
+        if key_env != DEFAULT_KEY_ENV[provider]:
+            name += f"@{key_env}"
+        members.append(
+            PoolMember(
+                provider,
+                model_id,
+                shared[client_key],
+                weight=float(entry.get("weight", 1.0)),
+                name=name,
+                config=config,
+            )
+        )
+    return ClientPool(members)
@@ -0,0 +1,182 @@
+import string
+from array import array
+
+################################
+# Prompt Compiler              #
+################################
+
+# Only four fields of the sentence template change from word to word. The
+# compiler binds everything else (languages, level) once per run and splits
+# the template into literal pieces and per-word slots, so building a prompt is
+# a single join instead of a str.format over the whole template. The output is
+# exactly what str.format would produce, so cached responses stay valid.
+
+ROW_FIELDS = ("number_of_sentences", "setting", "target_word", "optional_instruction")
+
+
+_encoding = None
+
+
+def _tokenizer():
+    """tiktoken's o200k_base encoding if tiktoken is installed, else False.
+
+    Imported on first use so that startup does not pay for it. Counts from it
+    are exact for current OpenAI models and close for Claude.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # Not installed, or the encoding could not be loaded (it is
+            # downloaded on first use).
+            _encoding = False
+    return _encoding
+
+
+def token_counting():
+    """How estimate_tokens counts, for reports."""
+    if _tokenizer():
+        return "tiktoken o200k_base"
+    return "approximated at ~4 characters per token (install tiktoken to count them)"
+
+
+def estimate_tokens(text):
+    """Tokens in text: counted with tiktoken if installed, else ~4 characters per token."""
+    encoding = _tokenizer()
+    if encoding:
+        return max(1, len(encoding.encode(text, disallowed_special=())))
+    return max(1, len(text) // 4)
+
+
+def target_count(row, default):
+    raw_count = row.get("count", "").strip()
+    try:
+        return int(raw_count) if raw_count else default
+    except ValueError:
+        return default
+
+
+def _compile(template, bound):
+    """Returns (pieces, slots): literal text with None where a row field goes.
+
+    slots lists (position, field name). Returns None for templates using
+    format specs, conversions or fields the compiler does not know; those are
+    rendered with plain str.format instead.
+    """
+    formatter = string.Formatter()
+    pieces = [""]
+    slots = []
+    for literal, name, spec, conversion in formatter.parse(template):
+        pieces[-1] += literal
+        if name is None:
+            continue
+        if name in bound:
+            value = formatter.convert_field(bound[name], conversion)
+            pieces[-1] += formatter.format_field(value, spec or "")
+        elif spec or conversion or name not in ROW_FIELDS:
+            return None
+        else:
+            slots.append((len(pieces), name))
+            pieces += [None, ""]
+    return pieces, slots
+
+
+class PromptCompiler:
+    """Builds the per-word prompts of one run from the validated settings."""
+
+    def __init__(self, settings, global_words=""):
+        prompts = settings.prompts
+        self.template = prompts.sentence_generation
+        self.bound = {
+            "target_language": settings.defaults.target_language,
+            "source_language": settings.defaults.source_language,
+            "language_level": settings.defaults.level,
+        }
+        self.compiled = _compile(self.template, self.bound)
+        self.global_text = (
+            prompts.global_words_addon.format(global_words=global_words)
+            if global_words
+            else ""
+        )
+        self.bonus_templates = {
+            "all": prompts.bonus_words_all,
+            "some": prompts.bonus_words_some,
+        }
+        self.default_setting = settings.defaults.setting
+        self.default_count = settings.defaults.number_of_sentences
+
+    def fields(self, row):
+        """The per-word template fields (count, setting, add-ons) of a CSV row."""
+        local_text = ""
+        bonus_words = row.get("bonus_words", "").strip()
+        if bonus_words:
+            mode = row.get("bonus_mode", "").strip() or "all"
+            template = self.bonus_templates.get(mode)
+            if template:
+                local_text = template.format(extra_words=bonus_words)
+
+        return {
+            "target_count": target_count(row, self.default_count),
+            "setting": row.get("setting", "").strip() or self.default_setting,
+            "optional_instruction": f"{self.global_text}\n{local_text}".strip(),
+        }
+
+    def iter_jobs(self, rows, tokens=None):
+        """Yields (word, fields) per row. Repeated words are separate jobs.
+
+        With the token counts from plan(), every job carries its prompt size
+        as fields["prompt_tokens"].
+        """
+        for i, row in enumerate(rows):
+            fields = self.fields(row)
+            if tokens is not None and i < len(tokens):
+                fields["prompt_tokens"] = tokens[i]
+            yield row.get("word", "").strip(), fields
+
+    def render(self, word, fields):
+        count = fields["target_count"]
+        values = {
+            "number_of_sentences": count,
+            "setting": fields["setting"],
+            "target_word": word,
+            "optional_instruction": fields["optional_instruction"],
+        }
+        if self.compiled is None:
+            prompt = self.template.format(**self.bound, **values)
+        else:
+            pieces, slots = self.compiled
+            pieces = pieces.copy()
+            for position, name in slots:
+                pieces[position] = str(values[name])
+            prompt = "".join(pieces)
+        return (
+            prompt
+            + f"\n\nCRITICAL SYSTEM OVERRIDE: You MUST output EXACTLY {count} sentence pair(s). Do NOT output more. Do NOT output less."
+        )
+
+    def render_many(self, jobs):
+        """Renders a whole list of (word, fields) jobs at once."""
+        render = self.render
+        return [render(word, fields) for word, fields in jobs]
+
+    def plan(self, rows, system_prompt=""):
+        """Estimated input tokens of every prompt (system prompt included), in row order.
+
+        Computed in one pass before any request, so the size of a run is known
+        up front; an array keeps this at 4 bytes per row. Counts come from
+        estimate_tokens, so they are approximate without tiktoken.
+        """
+        render = self.render
+        tokens = array("I")
+        if _tokenizer():
+            system_tokens = estimate_tokens(system_prompt) if system_prompt else 0
+            for word, fields in self.iter_jobs(rows):
+                tokens.append(system_tokens + estimate_tokens(render(word, fields)))
+            return tokens
+        system_chars = len(system_prompt)
+        for word, fields in self.iter_jobs(rows):
+            tokens.append(max(1, (system_chars + len(render(word, fields))) // 4))
+        return tokens
@@ -0,0 +1,234 @@
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+
+from .control import RunStopped
+
+################################
+# Retries & Circuit Breakers   #
+################################
+
+# Every provider call (OpenAI, Claude, edge-tts) goes through call_with_retry.
+# Errors are classified first: permanent ones (bad request, auth, invalid
+# voice) fail at once, rate limits wait for the provider's Retry-After, and
+# everything else is retried with exponential backoff and jitter. A circuit
+# breaker per provider pauses all callers when a provider keeps failing, so a
+# throttled or broken API isn't hammered by every concurrent task at once.
+
+RATE_LIMITED = "rate_limited"
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+# HTTP statuses worth retrying besides 429: timeouts, conflicts, server
+# errors and Anthropic's 529 "overloaded".
+_RETRYABLE_STATUSES = {408, 409, 500, 502, 503, 504, 529}
+_PERMANENT_TYPES = (ValueError, TypeError, KeyError, AttributeError, IndexError)
+
+
+def _status_code(exc):
+    # openai/anthropic use status_code, aiohttp (edge-tts) uses status.
+    status = getattr(exc, "status_code", None) or getattr(exc, "status", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(exc):
+    if isinstance(exc, RunStopped):
+        # Not the provider's fault; retrying or failing over would spend more.
+        return PERMANENT
+    status = _status_code(exc)
+    if status == 429:
+        return RATE_LIMITED
+    if status in _RETRYABLE_STATUSES or (status and status >= 500):
+        return TRANSIENT
+    if status and 400 <= status < 500:
+        return PERMANENT
+    if isinstance(exc, _PERMANENT_TYPES):
+        return PERMANENT
+    # Connection resets, timeouts, empty TTS streams, unknown SDK errors.
+    return TRANSIENT
+
+
+def retry_after_seconds(exc):
+    """Reads retry-after-ms / retry-after from the error's HTTP response, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or getattr(exc, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """How often and how long to wait between attempts of one call."""
+
+    def __init__(self, max_retries=3, backoff_seconds=2.0, max_backoff_seconds=60.0):
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+    @classmethod
+    def from_config(cls, config, section, default_retries=3):
+        section_cfg = config.get(section) or {}
+        resilience_cfg = config.get("resilience") or {}
+        return cls(
+            max_retries=int(section_cfg.get("max_retries", default_retries)),
+            backoff_seconds=float(section_cfg.get("backoff_seconds", 2.0)),
+            max_backoff_seconds=float(resilience_cfg.get("max_backoff_seconds", 60.0)),
+        )
+
+    def delay(self, attempt, retry_after=None):
+        # Full exponential curve, then jitter so parallel tasks don't retry in lockstep.
+        backoff = min(self.max_backoff_seconds, self.backoff_seconds * (2**attempt))
+        backoff *= random.uniform(0.5, 1.0)
+        if retry_after is not None:
+            return min(self.max_backoff_seconds, max(retry_after, backoff))
+        return backoff
+
+
+class CircuitBreaker:
+    """Per-provider breaker shared by every task talking to that provider.
+
+    closed: calls pass. After failure_threshold consecutive failures it opens
+    and all callers wait for cooldown_seconds; then one probe call is let
+    through (half-open). A successful probe closes the breaker, a failed one
+    opens it again. A Retry-After from the provider pauses all callers for that
+    long without counting as a trip.
+    """
+
+    def __init__(self, name, failure_threshold=5, cooldown_seconds=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self._paused_until = 0.0
+        self._probing = False
+
+    async def acquire(self):
+        while True:
+            wait = self._paused_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            if self.state == "closed":
+                return
+            if not self._probing:
+                self.state = "half_open"
+                self._probing = True
+                return
+            # Another task is probing; check back shortly.
+            await asyncio.sleep(min(1.0, self.cooldown_seconds))
+
+    def available(self):
+        """True if acquire() would not have to wait right now."""
+        if self._paused_until > time.monotonic():
+            return False
+        return self.state == "closed" or not self._probing
+
+    def record_success(self):
+        self.failures = 0
+        self.state = "closed"
+        self._probing = False
+
+    def release(self):
+        # A probe that was cancelled neither succeeded nor failed.
+        if self.state == "half_open":
+            self._probing = False
+
+    def record_failure(self, retry_after=None):
+        now = time.monotonic()
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self._probing = False
+            self._paused_until = max(self._paused_until, now + self.cooldown_seconds)
+            return True
+        return False
+
+
+_breakers = {}
+
+
+def get_breaker(provider, config):
+    """Returns the process-wide breaker of a provider ('openai', 'claude', 'edge_tts').
+
+    Client pool members use their own name (e.g. 'openai/gpt-4o-mini@KEY_2').
+    """
+    if provider not in _breakers:
+        resilience_cfg = config.get("resilience") or {}
+        _breakers[provider] = CircuitBreaker(
+            provider,
+            failure_threshold=int(resilience_cfg.get("breaker_failure_threshold", 5)),
+            cooldown_seconds=float(
+                resilience_cfg.get("breaker_cooldown_seconds", 30.0)
+            ),
+        )
+    return _breakers[provider]
+
+
+async def call_with_retry(operation, policy, breaker=None, on_retry=None):
+    """Awaits operation() until it succeeds, fails permanently or runs out of retries.
+
+    operation is a zero-argument coroutine function, called anew for every
+    attempt. on_retry(attempt, exc, kind, delay) is called before each wait.
+    The last exception is re-raised when giving up.
+    """
+    attempt = 0
+    while True:
+        if breaker:
+            await breaker.acquire()
+        try:
+            result = await operation()
+        except Exception as e:
+            kind = classify_error(e)
+            if kind == PERMANENT:
+                # The provider answered, it just didn't like this request.
+                if breaker:
+                    breaker.record_success()
+                raise
+
+            retry_after = retry_after_seconds(e)
+            if breaker:
+                breaker.record_failure(retry_after)
+            if attempt >= policy.max_retries:
+                raise
+
+            delay = policy.delay(attempt, retry_after)
+            if on_retry:
+                on_retry(attempt, e, kind, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+
+        except BaseException:
+            if breaker:
+                breaker.release()
+            raise
+
+        if breaker:
+            breaker.record_success()
+        return result
@@ -0,0 +1,509 @@
+import os
+import string
+import typing
+import threading
+from dataclasses import MISSING, dataclass, field, fields, is_dataclass
+
+import yaml
+
+################################
+# Typed, Validated Settings    #
+################################
+
+# config.yaml is parsed into the slotted dataclasses below once per process
+# and checked as a whole before a run starts: wrong types, unknown keys
+# (usually typos), missing voices or models for the selected providers and
+# unknown prompt placeholders are all reported together, in milliseconds,
+# instead of surfacing as a KeyError an hour into a run.
+#
+# Defaults match the ones the modules used to fall back to. The validated
+# YAML dict stays available as Settings.raw for code that takes a config dict.
+
+DEFAULT_CONFIG_PATH = "config.yaml"
+
+
+def _option(default=MISSING, choices=None, min=None, max=None):
+    """A field with validation rules (no default = required key)."""
+    rules = {"choices": choices, "min": min, "max": max}
+    if isinstance(default, (list, dict)):
+        return field(default_factory=default.copy, metadata=rules)
+    return field(default=default, metadata=rules)
+
+
+def _section(cls):
+    return field(default_factory=cls)
+
+
+@dataclass(slots=True)
+class ModelSettings:
+    audio: str = _option(choices=("openai", "edge_tts"))
+    sentence_generation: str = _option("openai", choices=("openai", "claude"))
+
+
+@dataclass(slots=True)
+class CompletionModelSettings:
+    model_id: str = _option("")
+    max_tokens: int = _option(1000, min=1)
+
+
+@dataclass(slots=True)
+class OpenAIAudioSettings:
+    model_id: str = _option("")
+    voices: list[str] = _option([])
+    speed: float = _option(1.0, min=0.25, max=4.0)
+    stream: bool = _option(False)
+
+
+@dataclass(slots=True)
+class OpenAISettings:
+    base_url: str | None = _option(None)
+    sentence_generation: CompletionModelSettings = _section(CompletionModelSettings)
+    audio: OpenAIAudioSettings = _section(OpenAIAudioSettings)
+
+
+@dataclass(slots=True)
+class ClaudeSettings:
+    model_id: str = _option("")
+    max_tokens: int = _option(1000, min=1)
+    base_url: str | None = _option(None)
+
+
+@dataclass(slots=True)
+class EdgeTTSSettings:
+    voices: list[str] = _option([])
+
+
+@dataclass(slots=True)
+class GenerationSettings:
+    concurrency: int = _option(5, min=1)
+    requests_per_minute: int | None = _option(None, min=1)
+    tokens_per_minute: int | None = _option(None, min=1)
+    pack_size: int = _option(1, min=1)
+    max_retries: int = _option(3, min=0)
+    backoff_seconds: float = _option(2.0, min=0)
+
+
+@dataclass(slots=True)
+class PoolMemberSettings:
+    provider: str = _option(choices=("openai", "claude"))
+    model_id: str | None = _option(None)
+    api_key_env: str | None = _option(None)
+    base_url: str | None = _option(None)
+    weight: float = _option(1.0, min=0)
+
+
+@dataclass(slots=True)
+class PoolSettings:
+    members: list[PoolMemberSettings] = _option([])
+
+
+@dataclass(slots=True)
+class BatchSettings:
+    poll_interval_seconds: float = _option(60, min=0)
+
+
+@dataclass(slots=True)
+class TTSSettings:
+    concurrency: int = _option(8, min=1)
+    per_voice_concurrency: int = _option(2, min=1)
+    max_retries: int = _option(4, min=0)
+    backoff_seconds: float = _option(2.0, min=0)
+    queue_size: int = _option(100, min=1)
+
+
+@dataclass(slots=True)
+class ResilienceSettings:
+    max_backoff_seconds: float = _option(60.0, min=0)
+    breaker_failure_threshold: int = _option(5, min=1)
+    breaker_cooldown_seconds: float = _option(30.0, min=0)
+
+
+@dataclass(slots=True)
+class AudioCacheSettings:
+    enabled: bool = _option(True)
+    max_size_mb: float | None = _option(None, min=0)
+
+
+@dataclass(slots=True)
+class CompletionCacheSettings:
+    enabled: bool = _option(True)
+    ttl_days: float | None = _option(None, min=0)
+
+
+@dataclass(slots=True)
+class CacheSettings:
+    dir: str = _option(".cache")
+    audio: AudioCacheSettings = _section(AudioCacheSettings)
+    completions: CompletionCacheSettings = _section(CompletionCacheSettings)
+
+
+@dataclass(slots=True)
+class DedupSettings:
+    enabled: bool = _option(True)
+    scope: str = _option("run", choices=("run", "deck"))
+    near_duplicates: bool = _option(False)
+    similarity: float = _option(0.8, min=0, max=1)
+
+
+@dataclass(slots=True)
+class ServeSettings:
+    spool_dir: str = _option("spool")
+    max_concurrent_jobs: int = _option(2, min=1)
+    poll_interval_seconds: float = _option(2.0, min=0.1)
+    port: int | None = _option(None, min=1, max=65535)
+
+
+@dataclass(slots=True)
+class ModelPrice:
+    # USD per million tokens; for audio models, output is the audio tokens.
+    input: float = _option(min=0)
+    output: float = _option(min=0)
+
+
+@dataclass(slots=True)
+class PricingSettings:
+    models: dict[str, ModelPrice] = _option({})
+    batch_discount: float = _option(0.5, min=0, max=1)
+    output_tokens_per_sentence: int = _option(40, min=1)
+    speech_chars_per_second: float = _option(15.0, min=1)
+    audio_tokens_per_second: float = _option(20.0, min=0)
+
+    def price(self, model_id):
+        """The ModelPrice of a model id; dated snapshots fall back to their base name."""
+        if not model_id:
+            return None
+        if model_id in self.models:
+            return self.models[model_id]
+        names = [name for name in self.models if model_id.startswith(name)]
+        return self.models[max(names, key=len)] if names else None
+
+
+@dataclass(slots=True)
+class BudgetSettings:
+    max_usd: float | None = _option(None, min=0)
+
+
+@dataclass(slots=True)
+class AnkiSettings:
+    deck_name: str = _option()
+    model_id: int = _option(min=1)
+    incremental: bool = _option(False)
+    media_compression: int = _option(0, min=0, max=9)
+    max_package_mb: float = _option(0, min=0)
+    packaging_workers: int = _option(4, min=1)
+
+
+@dataclass(slots=True)
+class DefaultsSettings:
+    target_language: str = _option()
+    source_language: str = _option()
+    level: str = _option()
+    number_of_sentences: int = _option(min=1)
+    setting: str = _option("")
+
+
+@dataclass(slots=True)
+class PromptsSettings:
+    system_prompt: str = _option()
+    sentence_generation: str = _option()
+    audio_instructions: str = _option("")
+    global_words_addon: str = _option("{global_words}")
+    bonus_words_all: str = _option("{extra_words}")
+    bonus_words_some: str = _option("{extra_words}")
+    packed_generation: str | None = _option(None)
+
+
+@dataclass(slots=True)
+class Settings:
+    model: ModelSettings = _section(ModelSettings)
+    openai: OpenAISettings = _section(OpenAISettings)
+    claude: ClaudeSettings = _section(ClaudeSettings)
+    edge_tts: EdgeTTSSettings = _section(EdgeTTSSettings)
+    generation: GenerationSettings = _section(GenerationSettings)
+    pool: PoolSettings = _section(PoolSettings)
+    batch: BatchSettings = _section(BatchSettings)
+    tts: TTSSettings = _section(TTSSettings)
+    resilience: ResilienceSettings = _section(ResilienceSettings)
+    cache: CacheSettings = _section(CacheSettings)
+    dedup: DedupSettings = _section(DedupSettings)
+    serve: ServeSettings = _section(ServeSettings)
+    pricing: PricingSettings = _section(PricingSettings)
+    budget: BudgetSettings = _section(BudgetSettings)
+    anki: AnkiSettings = _section(AnkiSettings)
+    defaults: DefaultsSettings = _section(DefaultsSettings)
+    prompts: PromptsSettings = _section(PromptsSettings)
+    raw: dict = field(default_factory=dict, compare=False, repr=False)
+
+    @property
+    def audio_voices(self):
+        if self.model.audio == "openai":
+            return self.openai.audio.voices
+        return self.edge_tts.voices
+
+    @property
+    def audio_model_id(self):
+        return self.openai.audio.model_id if self.model.audio == "openai" else None
+
+    @property
+    def sentence_model_id(self):
+        if self.model.sentence_generation == "openai":
+            return self.openai.sentence_generation.model_id
+        return self.claude.model_id
+
+    @property
+    def sentence_model_ids(self):
+        """Models answering sentence requests: the pool members, or the configured one."""
+        if not self.pool.members:
+            return [self.sentence_model_id]
+        defaults = {
+            "openai": self.openai.sentence_generation.model_id,
+            "claude": self.claude.model_id,
+        }
+        return [m.model_id or defaults[m.provider] for m in self.pool.members]
+
+
+# Placeholders the pipeline fills in for each prompt template.
+PROMPT_FIELDS = {
+    "sentence_generation": {
+        "number_of_sentences",
+        "target_language",
+        "source_language",
+        "language_level",
+        "setting",
+        "target_word",
+        "optional_instruction",
+    },
+    "packed_generation": {
+        "entries",
+        "target_language",
+        "source_language",
+        "language_level",
+    },
+    "global_words_addon": {"global_words"},
+    "bonus_words_all": {"extra_words"},
+    "bonus_words_some": {"extra_words"},
+}
+
+
+def _type_name(hint):
+    return getattr(hint, "__name__", str(hint))
+
+
+def _convert(value, hint, path, errors):
+    """Checks one value against its annotation; returns it (converted) or None."""
+    args = typing.get_args(hint)
+    if type(None) in args:
+        if value is None:
+            return None
+        hint = next(arg for arg in args if arg is not type(None))
+        args = typing.get_args(hint)
+
+    if is_dataclass(hint):
+        return _parse(hint, value, path, errors)
+    if typing.get_origin(hint) is list:
+        if not isinstance(value, list):
+            errors.append(f"{path}: expected a list, got {value!r}")
+            return []
+        return [
+            _convert(item, args[0], f"{path}[{i}]", errors)
+            for i, item in enumerate(value)
+        ]
+    if typing.get_origin(hint) is dict:
+        if not isinstance(value, dict):
+            errors.append(f"{path}: expected a mapping, got {value!r}")
+            return {}
+        return {
+            str(key): _convert(item, args[1], f"{path}.{key}", errors)
+            for key, item in value.items()
+        }
+    if (
+        hint is float
+        and isinstance(value, (int, float))
+        and not isinstance(value, bool)
+    ):
+        return float(value)
+    if isinstance(value, hint) and not (hint is int and isinstance(value, bool)):
+        return value
+    errors.append(f"{path}: expected {_type_name(hint)}, got {value!r}")
+    return None
+
+
+def _parse(cls, data, path, errors):
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        errors.append(f"{path}: expected a section, got {data!r}")
+        data = {}
+
+    hints = typing.get_type_hints(cls)
+    names = {f.name for f in fields(cls) if f.name != "raw"}
+    for key in data:
+        if key not in names:
+            errors.append(
+                f"{path}.{key}: unknown setting" if path else f"{key}: unknown section"
+            )
+
+    values = {}
+    for f in fields(cls):
+        if f.name == "raw":
+            continue
+        key_path = f"{path}.{f.name}" if path else f.name
+        value = data.get(f.name)
+        if value is None and type(None) not in typing.get_args(hints[f.name]):
+            if is_dataclass(hints[f.name]):
+                section = _parse(hints[f.name], {}, key_path, errors)
+                if section is not None:
+                    values[f.name] = section
+                continue
+            if f.default is MISSING and f.default_factory is MISSING:
+                errors.append(f"{key_path}: required setting is missing")
+            continue
+        value = _convert(value, hints[f.name], key_path, errors)
+        if value is None:
+            continue
+
+        rules = f.metadata
+        if rules.get("choices"):
+            # Choices are case-insensitive ("OpenAI" works). The lowercase form
+            # also goes back into the raw config for code that reads the dict.
+            choice = value.lower() if isinstance(value, str) else value
+            if choice not in rules["choices"]:
+                errors.append(
+                    f"{key_path}: must be one of {', '.join(rules['choices'])}, got {value!r}"
+                )
+                continue
+            value = data[f.name] = choice
+        if rules.get("min") is not None and value < rules["min"]:
+            errors.append(f"{key_path}: must be at least {rules['min']}, got {value!r}")
+            continue
+        if rules.get("max") is not None and value > rules["max"]:
+            errors.append(f"{key_path}: must be at most {rules['max']}, got {value!r}")
+            continue
+        values[f.name] = value
+
+    try:
+        return cls(**values)
+    except TypeError:
+        # A required setting is missing; already reported above.
+        return None
+
+
+def _check_providers(settings, errors):
+    if settings.model.sentence_generation == "openai":
+        if not settings.openai.sentence_generation.model_id:
+            errors.append(
+                "openai.sentence_generation.model_id: required for OpenAI sentences"
+            )
+    elif not settings.claude.model_id:
+        errors.append("claude.model_id: required for Claude sentences")
+
+    if settings.model.audio == "openai":
+        if not settings.openai.audio.model_id:
+            errors.append("openai.audio.model_id: required for OpenAI audio")
+        if not settings.openai.audio.voices:
+            errors.append("openai.audio.voices: list at least one voice")
+    elif not settings.edge_tts.voices:
+        errors.append("edge_tts.voices: list at least one voice")
+
+
+def _check_budget(settings, errors):
+    # A budget can only be enforced for models it knows the price of.
+    if settings.budget.max_usd is None:
+        return
+    models = list(settings.sentence_model_ids)
+    if settings.model.audio == "openai":
+        models.append(settings.openai.audio.model_id)
+    for model_id in dict.fromkeys(models):
+        if settings.pricing.price(model_id) is None:
+            errors.append(
+                f"pricing.models: no price for '{model_id}', needed for budget.max_usd"
+            )
+
+
+def _check_packing(settings, errors):
+    if settings.generation.pack_size > 1 and not settings.prompts.packed_generation:
+        errors.append(
+            "prompts.packed_generation: required when generation.pack_size is above 1 "
+            "(copy it from config.yaml.example)"
+        )
+
+
+def _check_prompts(prompts, errors):
+    # Works on the raw section, so placeholder typos are reported together
+    # with any other problem in the file.
+    prompts = prompts if isinstance(prompts, dict) else {}
+    for name, allowed in PROMPT_FIELDS.items():
+        template = prompts.get(name)
+        if not isinstance(template, str):
+            continue
+        try:
+            used = {
+                field_name.split(".")[0].split("[")[0]
+                for _, field_name, _, _ in string.Formatter().parse(template)
+                if field_name is not None
+            }
+        except ValueError as e:
+            errors.append(f"prompts.{name}: broken template ({e})")
+            continue
+        for placeholder in sorted(used - allowed):
+            errors.append(
+                f"prompts.{name}: unknown placeholder {{{placeholder}}} "
+                f"(available: {', '.join(sorted(allowed))})"
+            )
+
+
+def parse_settings(raw, source="config"):
+    """Validates a config dict; returns Settings or raises with every problem found."""
+    errors = []
+    if not isinstance(raw, dict):
+        raise Exception(f"{source} must be a YAML mapping of sections.")
+    settings = _parse(Settings, raw, "", errors)
+    _check_prompts(raw.get("prompts"), errors)
+    if not errors:
+        _check_providers(settings, errors)
+        _check_budget(settings, errors)
+        _check_packing(settings, errors)
+    if errors:
+        raise Exception(
+            f"Invalid configuration in {source}:\n"
+            + "\n".join(f"  - {error}" for error in errors)
+        )
+    settings.raw = raw
+    return settings
+
+
+class _SettingsCache:
+    """Parsed settings per config file, re-read only when the file changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise Exception(f"Configuration file '{path}' not found.")
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == stamp:
+                return entry[1]
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    raw = yaml.safe_load(f)
+            except yaml.YAMLError as exc:
+                raise Exception(f"Error parsing YAML config: {exc}")
+            settings = parse_settings(raw, source=path)
+            self._entries[path] = (stamp, settings)
+            return settings
+
+
+_cache = _SettingsCache()
+
+
+def load_settings(config_path=None):
+    """Returns the validated settings; cached until the file's mtime changes."""
+    return _cache.get(config_path or DEFAULT_CONFIG_PATH)